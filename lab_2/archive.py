@@ -0,0 +1,81 @@
+# ===== [IMPORT: Importing standard libraries] =====
+import gzip
+import hashlib
+import os
+import tempfile
+
+# zstandard is optional, without it the pages are compressed with gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ARCHIVE_DIR = "archive" # downloaded pages, kept to extract the articles again after the DOM of a site is changed
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+#######################################################################################################
+# ===== [FUNCTION: Compress the page] =====
+def compress(body):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), ".zst"
+
+    return gzip.compress(body, GZIP_LEVEL, mtime=0), ".gz" # mtime=0: the same page gives the same file
+
+# ===== [FUNCTION: Decompress the page] =====
+def decompress(data, extension):
+    if extension == ".zst":
+        if zstandard is None:
+            raise RuntimeError("[!] The page is compressed with zstd!\n*[TIP]: Install `zstandard` to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    return gzip.decompress(data)
+
+# ===== [CLASS: Content-addressed archive of downloaded pages] =====
+class PageArchive:
+    def __init__(self, store, directory=ARCHIVE_DIR):
+        self.store = store # keeps which page was downloaded from where and when
+        self.directory = directory
+
+    # ===== [METHOD: Get path of the page in the archive (without extension)] =====
+    def path(self, page_hash):
+        return os.path.join(self.directory, page_hash[:2], page_hash)
+
+    # ===== [METHOD: Find the file of the page] =====
+    def find(self, page_hash):
+        for extension in (".zst", ".gz"):
+            if os.path.isfile(self.path(page_hash) + extension):
+                return self.path(page_hash) + extension, extension
+
+        return None, None
+
+    # ===== [METHOD: Save the downloaded page] =====
+    def put(self, source, url, body, encoding=None, fetched_at=None):
+        page_hash = hashlib.sha256(body).hexdigest()
+
+        if self.find(page_hash)[0] is None: # the same page downloaded again takes no space
+            data, extension = compress(body)
+            directory = os.path.dirname(self.path(page_hash))
+            os.makedirs(directory, exist_ok=True)
+
+            # written to a temporary file first, so a half-written page is never read
+            descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            try:
+                with os.fdopen(descriptor, "wb") as file:
+                    file.write(data)
+                os.replace(temp_path, self.path(page_hash) + extension)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+        self.store.add_page(page_hash, source, url, encoding, fetched_at)
+        return page_hash # return for future handling
+
+    # ===== [METHOD: Read the page] =====
+    def get(self, page_hash):
+        path, extension = self.find(page_hash)
+        if path is None:
+            raise KeyError(f"[!] There is no page {page_hash} in the archive: {self.directory}")
+
+        with open(path, "rb") as file:
+            return decompress(file.read(), extension)
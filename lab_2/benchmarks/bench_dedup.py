@@ -0,0 +1,122 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from array import array
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+LAB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, LAB_DIR) # lab_2 modules
+
+# ===== [IMPORT: Importing local modules] =====
+from store import ArticleStore
+from dedup import DuplicateIndex, signature, band_keys, similarity, article_text
+
+
+# generating the archive costs a few ms per article in pure Python (MinHash of every one of them, ~1 hour for 1M),
+# so the default stops at 100k, pass --sizes 1000 10000 100000 1000000 for the full scale
+SIZES = [1000, 10000, 100000]
+BATCH = 1000 # articles of one generated refresh
+NEW_ARTICLES = 200 # articles measured on every size, half of them are rewritten archived ones
+NAIVE_ARTICLES = 10 # articles compared with the whole archive one by one
+#######################################################################################################
+# ===== [FUNCTION: Collect words of the samples] =====
+def vocabulary():
+    words = []
+
+    for sample in glob.glob(os.path.join(LAB_DIR, "samples", "*.json")):
+        with open(sample, "r", encoding="utf-8") as file:
+            for article in json.load(file)['articles']:
+                words += re.findall(r"\w+", article['title'] + " " + article['descr'])
+
+    return sorted(set(words))
+
+# ===== [FUNCTION: Generate one article] =====
+def make_article(randomizer, words, number):
+    return {
+        'title': " ".join(randomizer.choices(words, k=8)),
+        'descr': " ".join(randomizer.choices(words, k=15)),
+        'link': f"https://site/{number}",
+        'tags': []
+    }
+
+# ===== [FUNCTION: Rewrite the article a bit, like another site does] =====
+def rewrite(randomizer, words, article, number):
+    title = article['title'].split()
+    title[randomizer.randrange(len(title))] = randomizer.choice(words)
+
+    return dict(article, title=" ".join(title), link=f"https://other/{number}")
+
+# ===== [FUNCTION: Compare the article with every archived one] =====
+def naive_cluster(sig, archive):
+    return max(archive, key=lambda other: similarity(sig, other), default=None)
+
+# ===== [FUNCTION: Run benchmark] =====
+def run(sizes=SIZES):
+    randomizer = random.Random(2019)
+    words = vocabulary()
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ArticleStore(os.path.join(directory, "articles.db"))
+        duplicates = DuplicateIndex(store)
+        archive = [] # archived articles with their clusters, to rewrite them
+
+        for size in sorted(sizes):
+            started = time.perf_counter()
+            while len(archive) < size:
+                batch = [make_article(randomizer, words, len(archive) + i) for i in range(min(BATCH, size - len(archive)))]
+                archive += duplicates.assign(batch)
+            fill_s = time.perf_counter() - started
+
+            # half of the new articles are rewritten archived ones, they should join the cluster of the original
+            originals = [randomizer.choice(archive) for _ in range(NEW_ARTICLES // 2)]
+            fresh = [rewrite(randomizer, words, original, size + i) for i, original in enumerate(originals)]
+            fresh += [make_article(randomizer, words, size + len(fresh) + i) for i in range(NEW_ARTICLES // 2)]
+
+            candidates = [len( store.similar(band_keys(signature( article_text(article) ))) ) for article in fresh]
+            timings = []
+            for article in fresh:
+                started = time.perf_counter()
+                duplicates.assign([article])
+                timings.append( (time.perf_counter() - started) * 1000 )
+            found = sum(1 for article, original in zip(fresh, originals) if article['cluster'] == original['cluster'])
+
+            # pairwise comparison with the whole archive, what LSH replaces
+            archived = [array("Q", sig) for sig, in store.connection().execute("SELECT signature FROM signatures")]
+            started = time.perf_counter()
+            for article in fresh[:NAIVE_ARTICLES]:
+                naive_cluster(signature( article_text(article) ), archived)
+            naive_ms = (time.perf_counter() - started) * 1000 / NAIVE_ARTICLES
+
+            # the new articles are removed, so every size is measured over the generated archive only
+            links = [article['link'] for article in fresh]
+            with store.connection() as connection:
+                connection.execute(f"DELETE FROM signatures WHERE link IN ({','.join('?' * len(links))})", links)
+                connection.execute(f"DELETE FROM lsh_buckets WHERE link IN ({','.join('?' * len(links))})", links)
+
+            results[size] = {
+                'fill_s': round(fill_s, 1),
+                'lsh_median_ms': round(statistics.median(timings), 3),
+                'lsh_max_ms': round(max(timings), 3),
+                'candidates': round(statistics.mean(candidates), 1),
+                'rewrites_found': f"{found}/{len(originals)}",
+                'pairwise_ms': round(naive_ms, 3)
+            }
+            print(f"{size:>8} articles: {results[size]}", flush=True)
+
+    return results
+
+# --------------- [ENTRY POINT] ---------------
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description="Cost of near-duplicate detection of one new article by archive size")
+    arguments.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="archive sizes (default: %(default)s)")
+    args = arguments.parse_args()
+
+    run(args.sizes)
@@ -0,0 +1,62 @@
+# ===== [IMPORT: Importing standard libraries] =====
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+LAB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, LAB_DIR) # lab_2 modules
+
+# ===== [IMPORT: Importing local modules] =====
+from engines import engines
+from lab_2 import find_articles, sites
+
+
+REPEATS = 20 # parses of every sample per engine
+#######################################################################################################
+# ===== [FUNCTION: Read sample page] =====
+def read_sample(page_label):
+    with open(os.path.join(LAB_DIR, "samples", page_label + ".htm"), "r", encoding="utf-8") as file:
+        return file.read()
+
+# ===== [FUNCTION: Measure one engine on one sample] =====
+def measure(engine_name, page_label):
+    engine = engines[engine_name]
+    html = read_sample(page_label)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KB on Linux
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        find_articles(engine.parse(html), page_label)
+    elapsed = (time.perf_counter() - started) / REPEATS
+
+    return {
+        'parse_ms': round(elapsed * 1000, 3),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    }
+
+# ===== [FUNCTION: Run benchmark] =====
+def run():
+    results = {}
+
+    for engine_name in engines:
+        for page_label in sites:
+            # every measurement runs in a fresh process, otherwise peak memory of one engine hides another
+            output = subprocess.check_output(
+                [sys.executable, os.path.abspath(__file__), "--single", engine_name, page_label],
+                cwd = LAB_DIR
+            )
+            results.setdefault(engine_name, {})[page_label] = json.loads(output)
+
+    return results
+
+# --------------- [ENTRY POINT] ---------------
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == "--single":
+        print(json.dumps( measure(sys.argv[2], sys.argv[3]) ))
+    else:
+        for engine_name, pages in run().items():
+            for page_label, result in pages.items():
+                print(f"{engine_name:>10} | {page_label:>10}: parse = {result['parse_ms']:8.2f} ms | peak RSS growth = {result['peak_rss_kb']:6d} KB")
@@ -0,0 +1,100 @@
+# ===== [IMPORT: Importing standard libraries] =====
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+LAB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, LAB_DIR) # lab_2 modules
+
+# ===== [IMPORT: Importing local modules] =====
+from store import ArticleStore
+
+
+ARTICLES = 100000 # size of the generated archive
+BATCH = 1000 # articles written by one store.add, like one refresh
+REPEATS = 50 # runs of every query
+QUERIES = [
+    ("one common word", "новости"),
+    ("one word in other form", "банкам"),
+    ("two words", "курс рубля"),
+    ("rare word", "аналитики"),
+    ("missing word", "абракадабра")
+]
+#######################################################################################################
+# ===== [FUNCTION: Collect words of the samples] =====
+def vocabulary():
+    words = []
+
+    for sample in glob.glob(os.path.join(LAB_DIR, "samples", "*.json")):
+        with open(sample, "r", encoding="utf-8") as file:
+            for article in json.load(file)['articles']:
+                words += re.findall(r"\w+", article['title'] + " " + article['descr'])
+
+    return words + ["банки", "курс", "рубля", "аналитики"]
+
+# ===== [FUNCTION: Generate the archive of articles] =====
+def fill(store, count, words):
+    randomizer = random.Random(2019) # the same archive on every run
+    sources = ["lifehacker", "mailru", "nnru"]
+
+    for start in range(0, count, BATCH):
+        articles = [
+            {
+                'title': " ".join(randomizer.choices(words, k=8)),
+                'descr': " ".join(randomizer.choices(words, k=25)),
+                'link': f"https://site/{i}",
+                'tags': [randomizer.choice(words).upper()]
+            }
+            for i in range(start, min(start + BATCH, count))
+        ]
+        store.add(sources[start // BATCH % len(sources)], "https://site/", articles)
+
+# ===== [FUNCTION: Measure the query in milliseconds] =====
+def measure(store, text, source=None):
+    timings = []
+
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        found = store.search(text, source)
+        timings.append( (time.perf_counter() - started) * 1000 )
+
+    return {'found': len(found), 'median_ms': round(statistics.median(timings), 3), 'max_ms': round(max(timings), 3)}
+
+# ===== [FUNCTION: Run benchmark] =====
+def run(count=ARTICLES):
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ArticleStore(os.path.join(directory, "articles.db"))
+
+        started = time.perf_counter()
+        fill(store, count, vocabulary())
+        results['fill_s'] = round(time.perf_counter() - started, 2) # writing with the index updated by triggers
+
+        started = time.perf_counter()
+        store.reindex()
+        results['reindex_s'] = round(time.perf_counter() - started, 2)
+
+        for name, text in QUERIES:
+            results[name] = measure(store, text)
+            results[name + " (one source)"] = measure(store, text, "mailru")
+
+    return results
+
+# --------------- [ENTRY POINT] ---------------
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description="Benchmark of /search over a generated archive")
+    arguments.add_argument("--articles", type=int, default=ARTICLES, help=f"size of the archive (default: {ARTICLES})")
+    args = arguments.parse_args()
+
+    results = run(args.articles)
+    print(f"{args.articles} articles: written in {results.pop('fill_s')} s, reindexed in {results.pop('reindex_s')} s")
+    for name, result in results.items():
+        print(f"{name:>32}: found {result['found']:>3} | median = {result['median_ms']} ms | max = {result['max_ms']} ms")
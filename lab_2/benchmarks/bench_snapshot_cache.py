@@ -0,0 +1,60 @@
+# ===== [IMPORT: Importing standard libraries] =====
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # lab_2 modules
+os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")) # snapshots are read from lab_2
+
+# ===== [IMPORT: Importing local modules] =====
+import lab_2
+
+
+REQUESTS = 2000 # requests per source and per mode
+#######################################################################################################
+# ===== [FUNCTION: Old page handler: read the snapshot and render it on every request] =====
+def uncached_page(page_label):
+    with open(lab_2.snapshot_path(page_label), "r", encoding="utf-8") as file:
+        articles_info = json.load(file)
+
+    page_info = {
+        'label': page_label,
+        'title': lab_2.sites[page_label][0],
+        'updated': lab_2.snapshot_mtime(page_label),
+        'refreshing': False
+    }
+
+    return lab_2.render_template('articles.html', articles = articles_info, page = page_info)
+
+# ===== [FUNCTION: Measure requests per second] =====
+def measure(client, path, headers=None):
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        response = client.get(path, headers=headers)
+    elapsed = time.perf_counter() - started
+
+    return REQUESTS / elapsed, response.status_code
+
+# ===== [FUNCTION: Run benchmark] =====
+def run():
+    lab_2.app.config['REFRESH_SCHEDULER'] = False # never touch the network while measuring
+    lab_2.app.add_url_rule('/uncached/<page_label>', 'uncached_page', uncached_page)
+    client = lab_2.app.test_client()
+
+    results = {}
+    for label in lab_2.sites:
+        etag = client.get('/' + label).headers['ETag']
+
+        results[label] = {
+            'uncached_rps': measure(client, '/uncached/' + label)[0],
+            'cached_rps': measure(client, '/' + label)[0],
+            'not_modified_rps': measure(client, '/' + label, {'If-None-Match': etag})[0]
+        }
+
+    return results
+
+# --------------- [ENTRY POINT] ---------------
+if __name__ == '__main__':
+    for label, result in run().items():
+        print(f"{label:>12}: " + " | ".join(f"{name} = {value:8.1f}" for name, value in result.items()))
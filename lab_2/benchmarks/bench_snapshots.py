@@ -0,0 +1,63 @@
+# ===== [IMPORT: Importing standard libraries] =====
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+LAB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, LAB_DIR) # lab_2 modules
+
+# ===== [IMPORT: Importing local modules] =====
+from snapshots import FORMATS, dumps, loads, write_snapshot, read_snapshot
+
+
+REPEATS = 500 # serializations of every sample per format
+#######################################################################################################
+# ===== [FUNCTION: Old writer: pretty json straight into the target file] =====
+def old_write(path, obj):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(obj, file, indent = 4, ensure_ascii = False)
+
+# ===== [FUNCTION: Measure average time of the call in microseconds] =====
+def timed(function, *args):
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        function(*args)
+    return round((time.perf_counter() - started) / REPEATS * 1e6, 1)
+
+# ===== [FUNCTION: Run benchmark] =====
+def run():
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        target = os.path.join(directory, "snapshot")
+
+        for sample in sorted(glob.glob(os.path.join(LAB_DIR, "samples", "*.json"))):
+            with open(sample, "r", encoding="utf-8") as file:
+                obj = json.load(file)
+
+            name = os.path.basename(sample)
+            results[name] = {'old_write_us': timed(old_write, target, obj)}
+
+            for fmt in FORMATS:
+                data = dumps(obj, fmt)
+                write_snapshot(target, obj, fmt)
+                assert read_snapshot(target) == obj # every format gives back the same snapshot
+
+                results[name][fmt] = {
+                    'size': len(data),
+                    'dumps_us': timed(dumps, obj, fmt),
+                    'loads_us': timed(loads, data),
+                    'atomic_write_us': timed(write_snapshot, target, obj, fmt)
+                }
+
+    return results
+
+# --------------- [ENTRY POINT] ---------------
+if __name__ == '__main__':
+    for name, result in run().items():
+        print(f"{name}: old pretty write = {result['old_write_us']} us")
+        for fmt in FORMATS:
+            print(f"    {fmt:>8}: " + " | ".join(f"{key} = {value}" for key, value in result[fmt].items()))
@@ -0,0 +1,147 @@
+# ===== [IMPORT: Importing standard libraries] =====
+import argparse
+import glob
+import json
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+
+LAB_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+REPEATS = 7 # fresh interpreters per import mode
+WORKERS = 4 # forked workers per memory mode
+
+# what the first refresh imports (see the functions of lab_2)
+PIPELINE = "import requests, bs4, fetcher, crawler, engines, partial, extractors, enricher"
+
+# every measurement runs in a fresh interpreter, so nothing is imported already
+IMPORT_SCRIPT = """
+import sys, time
+sys.path.insert(0, {lab_dir!r})
+started = time.perf_counter()
+import lab_2
+if {eager}:
+    {pipeline}
+print(time.perf_counter() - started)
+"""
+
+# the master forks the workers like gunicorn does, every worker serves all sources once and reports its memory
+MEMORY_SCRIPT = """
+import json, os, signal, sys
+sys.path.insert(0, {lab_dir!r})
+
+def serve():
+    import lab_2
+    lab_2.app.config['REFRESH_SCHEDULER'] = False # never touch the network while measuring
+    if {eager}:
+        {pipeline}
+    client = lab_2.app.test_client()
+    for label in lab_2.sites:
+        assert client.get('/' + label).status_code == 200
+
+if {preload}:
+    import lab_2
+    lab_2.app.config['REFRESH_SCHEDULER'] = False
+    lab_2.preload()
+
+children = []
+for _ in range({workers}):
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        serve()
+        os.write(write_end, b"1")
+        os.close(write_end)
+        signal.pause() # keep the memory until it's measured
+        os._exit(0)
+    os.close(write_end)
+    os.read(read_end, 1)
+    os.close(read_end)
+    children.append(pid)
+
+print(json.dumps(children), flush=True)
+sys.stdin.read() # the benchmark closes stdin after the measuring
+"""
+#######################################################################################################
+# ===== [FUNCTION: Read memory of the process in KiB (Linux)] =====
+def memory(pid):
+    values = {}
+
+    with open(f"/proc/{pid}/smaps_rollup", "r") as file:
+        for line in file:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                values[name] = int(rest.split()[0])
+
+    return {
+        'rss': values['Rss'],
+        'pss': values['Pss'], # shared pages are divided between the processes which share them
+        'private': values['Private_Clean'] + values['Private_Dirty']
+    }
+
+# ===== [FUNCTION: Copy the snapshots to the working directory of the benchmark] =====
+def prepare(directory):
+    for snapshot in glob.glob(os.path.join(LAB_DIR, "*_articles.json")):
+        shutil.copy(snapshot, directory)
+
+# ===== [FUNCTION: Measure import time of lab_2] =====
+def import_time(directory, eager, repeats=REPEATS):
+    script = IMPORT_SCRIPT.format(lab_dir=LAB_DIR, eager=eager, pipeline=PIPELINE)
+    timings = [
+        float(subprocess.run([sys.executable, "-c", script], cwd=directory, capture_output=True, text=True, check=True).stdout)
+        for _ in range(repeats)
+    ]
+
+    return round(statistics.median(timings) * 1000, 1)
+
+# ===== [FUNCTION: Measure memory of the forked workers] =====
+def worker_memory(directory, eager, preload, workers=WORKERS):
+    script = MEMORY_SCRIPT.format(lab_dir=LAB_DIR, eager=eager, preload=preload, workers=workers, pipeline=PIPELINE)
+    master = subprocess.Popen([sys.executable, "-c", script], cwd=directory, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    children = json.loads(master.stdout.readline())
+
+    try:
+        usage = [memory(pid) for pid in children]
+    finally:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+        master.stdin.close()
+        master.wait()
+
+    return {name: round(statistics.mean(worker[name] for worker in usage) / 1024, 1) for name in usage[0]}
+
+# ===== [FUNCTION: Run benchmark] =====
+def run(repeats=REPEATS, workers=WORKERS):
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        prepare(directory) # the store and the archive of the benchmark are created here, not in lab_2
+
+        results['import_ms'] = {
+            'eager': import_time(directory, True, repeats),
+            'lazy': import_time(directory, False, repeats)
+        }
+        results['worker_mib'] = {
+            'eager': worker_memory(directory, True, False, workers), # every worker imports and renders everything itself
+            'preload_lazy': worker_memory(directory, False, True, workers) # forked after preload()
+        }
+
+    return results
+
+# --------------- [ENTRY POINT] ---------------
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description="Import time of lab_2 and memory of forked workers, eager vs lazy + preload")
+    arguments.add_argument("--repeats", type=int, default=REPEATS, help="fresh interpreters per import mode (default: %(default)s)")
+    arguments.add_argument("--workers", type=int, default=WORKERS, help="forked workers per memory mode (default: %(default)s)")
+    args = arguments.parse_args()
+
+    results = run(args.repeats, args.workers)
+    print("Import of lab_2: " + " | ".join(f"{mode} = {value} ms" for mode, value in results['import_ms'].items()))
+    for mode, usage in results['worker_mib'].items():
+        print(f"{mode:>12} worker: " + " | ".join(f"{name} = {value} MiB" for name, value in usage.items()))
@@ -0,0 +1,230 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from unittest import mock
+import argparse
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+LAB_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+SAMPLES_DIR = os.path.join(LAB_DIR, "samples")
+RESULTS_DIR = os.path.join(LAB_DIR, "benchmarks", "results")
+sys.path.insert(0, LAB_DIR) # lab_2 modules
+
+# ===== [IMPORT: Importing local modules] =====
+from bs4 import BeautifulSoup
+from engines import engines
+from store import ArticleStore
+import lab_2
+
+
+REPEATS = 20 # runs of every measured call
+#######################################################################################################
+# ===== [FUNCTION: Measure the call] =====
+def measure(function, repeats=REPEATS, setup=None):
+    timings = []
+
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        timings.append( (time.perf_counter() - started) * 1000 )
+
+    return {
+        'runs': repeats,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3)
+    }
+
+# ===== [FUNCTION: Read sample page] =====
+def read_sample(page_label):
+    with open(os.path.join(SAMPLES_DIR, page_label + ".htm"), "r", encoding="utf-8") as file:
+        return file.read()
+
+# ===== [CLASS: Handler of the stand-in server: samples are served as utf-8 html] =====
+class SampleHandler(SimpleHTTPRequestHandler):
+    def guess_type(self, path):
+        return "text/html; charset=utf-8"
+
+    def log_message(self, format, *args):
+        pass # keep the benchmark output clean
+
+# ===== [FUNCTION: Run local HTTP server with the samples] =====
+@contextmanager
+def stand_in_server():
+    handler = functools.partial(SampleHandler, directory=SAMPLES_DIR)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+# ===== [FUNCTION: Stage: building BeautifulSoup trees] =====
+def bench_soup():
+    return {
+        page_label: measure(lambda html=read_sample(page_label): BeautifulSoup(html, "html.parser"))
+        for page_label in lab_2.sites
+    }
+
+# ===== [FUNCTION: Stage: find_articles on already parsed pages] =====
+def bench_find_articles():
+    results = {}
+
+    for engine_name, engine in engines.items():
+        for page_label in lab_2.sites:
+            page = engine.parse( read_sample(page_label) )
+            results[f"{engine_name}/{page_label}"] = measure(lambda: lab_2.find_articles(page, page_label))
+
+    return results
+
+# ===== [FUNCTION: Stage: writing snapshots] =====
+def bench_generate_json(directory):
+    results = {}
+
+    for page_label in lab_2.sites:
+        with open(os.path.join(SAMPLES_DIR, page_label + ".json"), "r", encoding="utf-8") as file:
+            snapshot = json.load(file)
+
+        for fmt in ["pretty", "compact", "binary"]:
+            path = os.path.join(directory, f"{page_label}.{fmt}")
+            results[f"{fmt}/{page_label}"] = measure(
+                lambda: lab_2.generate_json(path, snapshot['url'], snapshot['articles'], fmt)
+            )
+
+    return results
+
+# ===== [FUNCTION: Stage: downloading and parsing through the stand-in server] =====
+def bench_fetch_and_parse(base_url):
+    results = {}
+
+    for page_label in lab_2.sites:
+        url = base_url + page_label + ".htm"
+
+        results[f"get_html_page/{page_label}"] = measure(lambda: lab_2.get_html_page(url))
+
+        # every run downloads and parses the page like it's new
+        results[f"parse_cold/{page_label}"] = measure(
+            lambda: lab_2.parse(url, page_label),
+            setup = lambda: lab_2.parsed_pages.pop(url, None)
+        )
+
+        # the page is the same, so the server answers 304 and nothing is parsed
+        results[f"parse_unchanged/{page_label}"] = measure(lambda: lab_2.parse(url, page_label))
+
+    return results
+
+# ===== [FUNCTION: Stage: rendering pages through the Flask test client] =====
+def bench_page_handler():
+    client = lab_2.app.test_client()
+    results = {}
+
+    for page_label in lab_2.sites:
+        path = "/" + page_label
+
+        results[f"render/{page_label}"] = measure(
+            lambda: client.get(path),
+            setup = lab_2.snapshot_cache.invalidate # rendered from the store every time
+        )
+        results[f"cached/{page_label}"] = measure(lambda: client.get(path))
+
+        etag = client.get(path).headers['ETag']
+        results[f"not_modified/{page_label}"] = measure(lambda: client.get(path, headers={'If-None-Match': etag}))
+
+    return results
+
+# ===== [FUNCTION: Run the whole suite] =====
+def run():
+    lab_2.app.config['REFRESH_SCHEDULER'] = False # never touch the network while measuring
+    lab_2.app.config['ENRICHMENT'] = False
+
+    results = {}
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory) # snapshots of parse() are written here, not over the ones in lab_2
+        store = ArticleStore(os.path.join(directory, "articles.db"))
+
+        try:
+            with mock.patch.object(lab_2, "store", store), \
+                 mock.patch.object(lab_2.store_feed, "store", store), \
+                 mock.patch.object(lab_2.duplicates, "store", store), \
+                 mock.patch.object(lab_2.page_archive, "store", store), \
+                 mock.patch("builtins.print"), \
+                 stand_in_server() as base_url:
+                stages = [
+                    ("soup", bench_soup),
+                    ("find_articles", bench_find_articles),
+                    ("generate_json", lambda: bench_generate_json(directory)),
+                    ("fetch_and_parse", lambda: bench_fetch_and_parse(base_url)),
+                    ("page_handler", bench_page_handler)
+                ]
+
+                for name, stage in stages:
+                    started = time.perf_counter()
+                    results[name] = stage()
+                    sys.stderr.write(f"{name}: done in {time.perf_counter() - started:.1f} s\n") # print() is muted here
+        finally:
+            os.chdir(cwd)
+
+    return results
+
+# ===== [FUNCTION: Describe where the results come from] =====
+def metadata():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=LAB_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+
+    return {
+        'commit': commit,
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'engines': list(engines),
+        'repeats': REPEATS
+    }
+
+# ===== [FUNCTION: Print the comparison with previous results] =====
+def compare(previous, current):
+    for stage, cases in current.items():
+        for case, result in cases.items():
+            before = previous.get(stage, {}).get(case)
+            if before is None:
+                continue
+
+            ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else float("inf")
+            mark = "  <-- slower" if ratio > 1.1 else ""
+            print(f"{stage:>16} | {case:<32} {before['median_ms']:9.3f} -> {result['median_ms']:9.3f} ms  (x{ratio:.2f}){mark}")
+
+# --------------- [ENTRY POINT] ---------------
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description="Offline benchmarks of the lab_2 pipeline over the samples")
+    arguments.add_argument("--output", help="where to save the results (default: benchmarks/results/<commit>.json)")
+    arguments.add_argument("--compare", help="previous results to compare with")
+    args = arguments.parse_args()
+
+    report = {'meta': metadata(), 'results': run()}
+
+    output = args.output or os.path.join(RESULTS_DIR, report['meta']['commit'] + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent = 4)
+    print("Results are saved to:", output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            compare(json.load(file)['results'], report['results'])
@@ -0,0 +1,117 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+import time
+
+# ===== [IMPORT: Importing local modules] =====
+from fetcher import host_limits, DEFAULT_HOST_LIMIT
+
+
+CRAWL_PAGES = 5 # listing pages downloaded by one crawl if nothing stops it earlier
+CRAWL_MAX_PAGES = 50 # the upper limit for the number of pages asked by the client
+CRAWL_DELAY = 1.0 # seconds between two batches of pages of the same site
+#######################################################################################################
+# ===== [FUNCTION: Read publish time written on the site] =====
+def parse_published(value):
+    try:
+        published = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None # the article is kept if its time is unknown
+
+    return published.replace(tzinfo=None) # local time of the site is compared with the cutoff date as is
+
+# ===== [FUNCTION: Crawl the listing of the site page by page] =====
+def crawl(url, get_listing, pages=CRAWL_PAGES, until=None, is_known=None, page_url=None, delay=CRAWL_DELAY):
+    # get_listing(url) -> (articles, publish times of the articles, link to the next page or None)
+    # is_known(links) -> the links which are already stored
+    # page_url is the address template of the page by its number, then several pages are downloaded at once
+    result = {
+        'url': url,
+        'pages': 0,
+        'articles': [],
+        'first_page': 0, # how many of the articles are from the first page
+        'stopped': "pages", # "pages", "last_page", "known", "until" or "error"
+        'error': None
+    }
+    seen = set()
+
+    # take the articles of one page, returns the reason to stop or None
+    def take(number, listing):
+        articles, published, next_url = listing
+        result['pages'] += 1
+
+        if not articles:
+            return "last_page"
+
+        reached_until = False
+        for article, published_at in zip(articles, published):
+            published_at = parse_published(published_at) if until is not None else None
+            if published_at is not None and published_at < until:
+                reached_until = True # the rest of the listing is older
+                continue
+
+            if article['link'] not in seen: # the articles move down while we crawl, so pages overlap
+                seen.add(article['link'])
+                result['articles'].append(article)
+
+        if number == 1:
+            result['first_page'] = len(result['articles'])
+        if reached_until:
+            return "until"
+
+        # the first page is always known after the usual refresh, so it doesn't stop the crawl
+        if number > 1 and is_known is not None:
+            links = [article['link'] for article in articles]
+            if len(is_known(links)) == len(set(links)):
+                return "known" # the deeper pages were crawled before
+
+        if number >= pages:
+            return "pages"
+        if page_url is None and next_url is None:
+            return "last_page"
+
+        return None
+
+    try:
+        listing = get_listing(url)
+        stopped = take(1, listing)
+    except Exception as e:
+        result['stopped'], result['error'] = "error", f"{type(e).__name__}: {e}"
+        return result
+
+    if page_url is None:
+        # the link to the next page is known only after the page is parsed, so pages go one by one
+        number = 1
+        while stopped is None:
+            number += 1
+            time.sleep(delay)
+            try:
+                listing = get_listing(listing[2])
+                stopped = take(number, listing)
+            except Exception as e:
+                stopped, result['error'] = "error", f"{type(e).__name__}: {e}"
+    else:
+        # as many pages at once as the site allows for one host, fetcher keeps this limit anyway
+        batch = host_limits.get(urlsplit(url).hostname, DEFAULT_HOST_LIMIT)
+        pool = ThreadPoolExecutor(max_workers=batch, thread_name_prefix="crawl")
+        number = 1
+
+        try:
+            while stopped is None:
+                time.sleep(delay)
+                numbers = list(range(number + 1, min(number + batch, pages) + 1))
+                futures = [pool.submit(get_listing, page_url.format(page=n)) for n in numbers]
+
+                for number, future in zip(numbers, futures):
+                    try:
+                        stopped = take(number, future.result())
+                    except Exception as e:
+                        stopped, result['error'] = "error", f"{type(e).__name__}: {e}"
+                    if stopped is not None:
+                        break # the rest of the batch is thrown away
+        finally:
+            pool.shutdown(wait=True) # the pages of the last batch are already being downloaded
+
+    result['stopped'] = stopped
+    return result # return for future handling
@@ -0,0 +1,106 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from array import array
+import hashlib
+import random
+import re
+import threading
+import zlib
+
+# ===== [IMPORT: Importing local modules] =====
+from search import normalize
+
+
+SHINGLE_SIZE = 5 # letters in one shingle of the text
+PERMUTATIONS = 64 # hash functions of the signature
+BANDS = 16 # the signature is cut into bands of PERMUTATIONS // BANDS values
+THRESHOLD = 0.5 # estimated Jaccard similarity from which two articles are the same story
+
+# multiply-shift hashing: (a * h + b) mod 2 ** 64 with odd `a`, the high bits are well mixed and they decide the minimum
+MASK = (1 << 64) - 1
+_randomizer = random.Random(2019) # the same functions in every worker and after restarts
+HASH_FUNCTIONS = [(_randomizer.randrange(1, 1 << 64) | 1, _randomizer.randrange(0, 1 << 64)) for _ in range(PERMUTATIONS)]
+
+NOT_LETTERS = re.compile(r"[\W_]+")
+#######################################################################################################
+# ===== [FUNCTION: Get shingles of the text (hashed)] =====
+def shingles(text):
+    text = NOT_LETTERS.sub(" ", normalize(text)).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode("utf-8"))}
+
+    # crc32 is stable between processes, unlike hash() of a string
+    return {zlib.crc32(text[i:i + SHINGLE_SIZE].encode("utf-8")) for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+# ===== [FUNCTION: Compute MinHash signature of the text] =====
+def signature(text):
+    hashes = shingles(text)
+
+    return array("Q", [min([(a * h + b) & MASK for h in hashes]) for a, b in HASH_FUNCTIONS])
+
+# ===== [FUNCTION: Get LSH keys of the signature, one per band] =====
+def band_keys(sig):
+    rows = len(sig) // BANDS
+
+    # the band number is in the high bits, so the same values in different bands don't meet
+    return [(band << 32) | zlib.crc32(sig[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+
+# ===== [FUNCTION: Estimate Jaccard similarity of two signatures] =====
+def similarity(first, second):
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+# ===== [FUNCTION: Get text of the article which is compared] =====
+def article_text(article):
+    return article['title'] + " " + (article['descr'] or "")
+
+# ===== [CLASS: Clusters of near-duplicate articles of all sources] =====
+class DuplicateIndex:
+    def __init__(self, store, threshold=THRESHOLD):
+        self.store = store
+        self.threshold = threshold
+        self._lock = threading.Lock() # two sources refreshed at once can bring the same story
+
+    # ===== [METHOD: Put `cluster` into every article] =====
+    def assign(self, articles):
+        links = [article['link'] for article in articles]
+
+        with self._lock:
+            known = self.store.clusters(links) # signatures are computed once per link
+            added = []
+
+            for article in articles:
+                cluster = known.get(article['link'])
+
+                if cluster is None:
+                    sig = signature( article_text(article) )
+                    keys = band_keys(sig)
+                    cluster = self.find_cluster(sig, keys, added)
+
+                    known[article['link']] = cluster
+                    added.append( (article['link'], cluster, sig, keys) )
+
+                article['cluster'] = cluster
+
+            self.store.save_signatures(added)
+
+        return articles # return for future handling
+
+    # ===== [METHOD: Find cluster of the most similar article, or start a new one] =====
+    def find_cluster(self, sig, keys, added):
+        # only articles sharing at least one band are compared, it doesn't depend on the size of the archive
+        candidates = self.store.similar(keys)
+        key_set = set(keys)
+        for link, cluster, other, other_keys in added: # the same story twice in one listing
+            if key_set.intersection(other_keys):
+                candidates[link] = (cluster, other)
+
+        best, best_similarity = None, self.threshold
+        for cluster, other in candidates.values():
+            value = similarity(sig, other)
+            if value >= best_similarity:
+                best, best_similarity = cluster, value
+
+        return best if best is not None else new_cluster(sig)
+
+# ===== [FUNCTION: Make id of the new cluster] =====
+def new_cluster(sig):
+    return hashlib.sha1(sig.tobytes()).hexdigest()[:12] # the same for the same text in every worker
@@ -0,0 +1,159 @@
+# ===== [IMPORT: Importing external libraries] =====
+from bs4 import BeautifulSoup, SoupStrainer
+import soupsieve
+
+# lxml and selectolax are optional, without them everything is parsed by bs4
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser # selectolax < 0.3 has only modest backend
+    except ImportError:
+        SelectolaxParser = None
+
+# ===== [IMPORT: Importing standard libraries] =====
+from functools import lru_cache
+
+
+ENGINE_PRIORITY = ["selectolax", "lxml", "bs4"] # the first installed one is used by default
+#######################################################################################################
+# ===== [CLASS: BeautifulSoup engine (html.parser)] =====
+class Bs4Engine:
+    name = "bs4"
+
+    def parse(self, html, only=None):
+        # with `only` the tree is built just for elements with this class and their children
+        parse_only = None
+        if only:
+            # bs4 versions pass either a single class or all of them joined with spaces
+            parse_only = SoupStrainer(class_=lambda classes: classes is not None and only in classes.split())
+        return BeautifulSoup(html, "html.parser", parse_only=parse_only)
+
+    def owns(self, page):
+        return type(page) is BeautifulSoup
+
+    def select_one(self, node, selector):
+        return node.select_one(selector)
+
+    def select(self, node, selector):
+        return node.select(selector)
+
+    def compile_one(self, selector):
+        return soupsieve.compile(selector).select_one
+
+    def compile_all(self, selector):
+        return soupsieve.compile(selector).select
+
+    def text(self, node):
+        return node.text
+
+    def attr(self, node, name):
+        return node.get(name)
+
+    def parent(self, node):
+        return node.parent
+
+# ===== [CLASS: lxml engine with compiled CSS selectors] =====
+class LxmlEngine:
+    name = "lxml"
+
+    def parse(self, html, only=None):
+        return lxml.html.document_fromstring(html) # fast enough to build the whole tree
+
+    def owns(self, page):
+        return isinstance(page, lxml.html.HtmlElement) and page.getparent() is None
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def compiled(selector):
+        return CSSSelector(selector) # every selector is translated to XPath only once
+
+    def select_one(self, node, selector):
+        found = self.compiled(selector)(node)
+        return found[0] if found else None
+
+    def select(self, node, selector):
+        return self.compiled(selector)(node)
+
+    def compile_one(self, selector):
+        compiled = self.compiled(selector)
+
+        def select_one(node):
+            found = compiled(node)
+            return found[0] if found else None
+        return select_one
+
+    def compile_all(self, selector):
+        return self.compiled(selector)
+
+    def text(self, node):
+        return str(node.text_content())
+
+    def attr(self, node, name):
+        return node.get(name)
+
+    def parent(self, node):
+        return node.getparent()
+
+# ===== [CLASS: selectolax engine (lexbor, or modest on old versions)] =====
+class SelectolaxEngine:
+    name = "selectolax"
+
+    def parse(self, html, only=None):
+        return SelectolaxParser(html) # fast enough to build the whole tree
+
+    def owns(self, page):
+        return type(page) is SelectolaxParser
+
+    def select_one(self, node, selector):
+        return node.css_first(selector)
+
+    def select(self, node, selector):
+        return node.css(selector)
+
+    def compile_one(self, selector):
+        return lambda node: node.css_first(selector)
+
+    def compile_all(self, selector):
+        return lambda node: node.css(selector)
+
+    def text(self, node):
+        return node.text(deep=True)
+
+    def attr(self, node, name):
+        return node.attributes.get(name)
+
+    def parent(self, node):
+        return node.parent
+
+#######################################################################################################
+engines = {"bs4": Bs4Engine()}
+
+if lxml is not None:
+    engines["lxml"] = LxmlEngine()
+if SelectolaxParser is not None:
+    engines["selectolax"] = SelectolaxEngine()
+
+# ===== [FUNCTION: Get engine by name] =====
+def get_engine(name=None):
+    if name is None:
+        name = next(engine for engine in ENGINE_PRIORITY if engine in engines)
+
+    try:
+        return engines[name]
+    except KeyError:
+        raise KeyError(f"[!] Parsing engine `{name}` is not installed! Available engines: {', '.join(engines)}")
+
+# ===== [FUNCTION: Get engine which has built the page] =====
+def engine_for(page):
+    for engine in engines.values():
+        if engine.owns(page):
+            return engine
+
+    return None
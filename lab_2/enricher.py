@@ -0,0 +1,79 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+# ===== [IMPORT: Importing local modules] =====
+from fetcher import FetchTimeout, FetchConnectionError, CircuitOpenError, UpstreamStatusError, RETRY_STATUSES
+from metrics import stage_timer
+
+
+ENRICH_WORKERS = 2 # pages of articles downloaded at once (fetcher.channel_host_limits limits them per host)
+ENRICH_QUEUE = 500 # links waiting for the workers, the rest are taken by the next refresh
+#######################################################################################################
+# ===== [CLASS: Background enrichment of articles with details from their pages] =====
+class Enricher:
+    def __init__(self, store, get_details, workers=ENRICH_WORKERS, queue_size=ENRICH_QUEUE, on_enriched=None):
+        self.store = store
+        self.get_details = get_details # get_details(link, page_label) -> {'descr', 'published', 'author'}
+        self.workers = workers
+        self.queue_size = queue_size
+        self.on_enriched = on_enriched # called with the label after details of its article are saved
+
+        self._pool = None # created on the first use, so it isn't shared by forked workers
+        self._pending = set() # links in the queue or being downloaded
+        self._idle = threading.Condition()
+
+    # ===== [METHOD: Queue the links which have no details yet] =====
+    def submit(self, page_label, links):
+        missing = self.store.missing_details(links) # every article is downloaded once in its lifetime
+
+        with self._idle:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="enrich")
+
+            queued = []
+            for link in missing:
+                if len(self._pending) >= self.queue_size:
+                    break
+                if link not in self._pending:
+                    self._pending.add(link)
+                    queued.append(link)
+
+        for link in queued:
+            self._pool.submit(self._enrich, page_label, link)
+
+        return len(queued)
+
+    # ===== [METHOD: Download details of one article] =====
+    def _enrich(self, page_label, link):
+        saved = False
+
+        try:
+            with stage_timer("enrich", page_label):
+                details = self.get_details(link, page_label)
+            self.store.save_details(link, details)
+            saved = True
+        except (FetchTimeout, FetchConnectionError, CircuitOpenError):
+            pass # the site is unavailable for now, the link is taken again by the next refresh
+        except UpstreamStatusError as e:
+            if e.status_code not in RETRY_STATUSES:
+                self.store.save_details(link, error=f"{type(e).__name__}: {e}") # 404 won't change
+        except Exception as e: # a page which can't be parsed is not downloaded again
+            self.store.save_details(link, error=f"{type(e).__name__}: {e}")
+        finally:
+            with self._idle:
+                self._pending.discard(link)
+                self._idle.notify_all()
+
+        if saved and self.on_enriched is not None:
+            self.on_enriched(page_label)
+
+    # ===== [METHOD: How many links are waiting] =====
+    def pending(self):
+        with self._idle:
+            return len(self._pending)
+
+    # ===== [METHOD: Wait until the queue is empty] =====
+    def wait(self, timeout=None):
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
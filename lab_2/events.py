@@ -0,0 +1,97 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from collections import deque
+import json
+import threading
+
+
+HISTORY_SIZE = 1000 # events kept in memory for clients which are a bit behind
+POLL_INTERVAL = 2.0 # seconds between two checks of the store for articles added by other workers
+HEARTBEAT_INTERVAL = 15.0 # seconds of silence after which clients get a comment, so proxies keep the connection
+#######################################################################################################
+# ===== [CLASS: Fan-out of new articles to all connected clients] =====
+class Broadcaster:
+    def __init__(self, history_size=HISTORY_SIZE):
+        self._events = deque(maxlen=history_size) # (event id, source, ready to send text)
+        self._condition = threading.Condition()
+        self.last_id = 0
+
+    # ===== [METHOD: Publish new articles] =====
+    def publish(self, items):
+        # items are (id, article), the text is formatted once and shared by all clients
+        with self._condition:
+            for event_id, article in items:
+                message = f"id: {event_id}\nevent: article\ndata: {json.dumps(article, ensure_ascii=False)}\n\n"
+                self._events.append( (event_id, article.get('source'), message) )
+                self.last_id = max(self.last_id, event_id)
+
+            self._condition.notify_all()
+
+    # ===== [METHOD: Wait for events after the given id] =====
+    def wait(self, after_id, timeout=HEARTBEAT_INTERVAL):
+        with self._condition:
+            self._condition.wait_for(lambda: self.last_id > after_id, timeout)
+
+            # walk from the newest event back, so a client pays only for events it hasn't seen
+            fresh = []
+            for event in reversed(self._events):
+                if event[0] <= after_id:
+                    break
+                fresh.append(event)
+
+        fresh.reverse()
+        return fresh
+
+# ===== [CLASS: Feed the broadcaster with articles added to the store] =====
+class StoreFeed:
+    def __init__(self, store, broadcaster, interval=POLL_INTERVAL):
+        self.store = store
+        self.broadcaster = broadcaster
+        self.interval = interval
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ===== [METHOD: Start the feed thread] =====
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self.broadcaster.last_id = max(self.broadcaster.last_id, self.store.last_rowid()) # old articles aren't pushed
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="store-feed", daemon=True)
+            self._thread.start()
+
+    # ===== [METHOD: Stop the feed thread] =====
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+        with self._lock:
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+
+    # ===== [METHOD: Check the store right now (called after a refresh in this worker)] =====
+    def wake(self):
+        self._wakeup.set()
+
+    # ===== [METHOD: Feed loop] =====
+    def _run(self):
+        # the store is shared by all gunicorn workers, so articles found by any of them are pushed by every one
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+
+            try:
+                added = self.store.added_since(self.broadcaster.last_id)
+            except Exception as e: # a locked database is retried on the next round
+                print("[!] Can't read new articles from the store:", e)
+                continue
+
+            if added:
+                self.broadcaster.publish(added)
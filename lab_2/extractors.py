@@ -0,0 +1,215 @@
+# ===== [IMPORT: Importing local modules] =====
+from engines import engines
+
+
+# Instructions for grabbing articles, one spec per site.
+# Every field is either a constant (`const`) or is taken from the element found by `select` inside the post:
+#   `parent` - take the parent of the found element,
+#   `attr` - take this attribute instead of the text, `prefix` - prepend it to the value,
+#   `select_all` - take texts of all found elements, `labels` - prepend labels to the first texts.
+# `strain` is the class of the outermost element of `container`, the page is partially parsed by it.
+# For crawling deeper than the first page (all optional):
+#   `next_page` - link to the next page of the listing, `page_url` - address of the page by its number,
+#   so the pages can be downloaded at once, `published` - element of the post with `datetime` attribute.
+site_specs = {
+    'lifehacker': {
+        'container': '.flow .flow__posts',
+        'strain': 'flow',
+        'posts': 'div.flow-post',
+        'drop_last': 0,
+
+        'fields': {
+            'title': {'select': '.flow-post__title'},
+            'descr': {'select': '.flow-post__excerpt'},
+            'link': {'select': '.flow-post__title', 'parent': True, 'attr': 'href'},
+            'tags': {'select_all': '.meta-mark span[class^="meta-info"]'}
+        },
+
+        'next_page': '.pagination a.next',
+        'page_url': "https://lifehacker.ru/topics/news/page/{page}/"
+    },
+    'mailru': {
+        'container': '.paging__content',
+        'strain': 'paging__content',
+        'posts': 'div.newsitem',
+        'drop_last': 0,
+
+        'fields': {
+            'title': {'select': '.cell .newsitem__title'},
+            'descr': {'select': '.cell .newsitem__text'},
+            'link': {'select': '.cell .newsitem__title', 'attr': 'href', 'prefix': "https://news.mail.ru/"},
+            'tags': {'select_all': '.newsitem__params span.newsitem__param', 'labels': ["Актуальность: ", "Источник: "]}
+        },
+
+        'published': '.newsitem__params span.js-ago' # the next pages are loaded by javascript, there's no link
+    },
+    'nnru': {
+        'container': '.rn-section_lenta-on-main .rn-info__list',
+        'strain': 'rn-section_lenta-on-main',
+        'posts': 'li.rn-info__item',
+        'drop_last': 1, # the last item of the list is a link to all news
+
+        'fields': {
+            'title': {'select': '.rn-info__announce .rn-info__announce-text'},
+            'descr': {'const': "Описание внутри статьи."},
+            'link': {'select': '.rn-info__announce .rn-info__announce-text', 'parent': True, 'attr': 'href'},
+            'tags': {'const': ["НОВОСТИ НИЖНЕГО НОВГОРОДА"]}
+        }
+    }
+}
+
+# Instructions for grabbing details from the page of the article: (selector, attribute) pairs tried in turn,
+# attribute None means the text. News sites fill the same meta tags for social networks, so they are shared,
+# a site can have its own `details` in the spec.
+detail_specs = {
+    'descr': [('meta[property="og:description"]', 'content'), ('meta[name="description"]', 'content')],
+    'published': [
+        ('meta[property="article:published_time"]', 'content'), ('[itemprop="datePublished"]', 'content'),
+        ('time[datetime]', 'datetime')
+    ],
+    'author': [
+        ('meta[name="author"]', 'content'), ('meta[property="article:author"]', 'content'),
+        ('[itemprop="author"] [itemprop="name"]', None)
+    ]
+}
+#######################################################################################################
+# ===== [CLASS: Extraction functions compiled from one spec for one engine] =====
+class Extractor:
+    def __init__(self, spec, engine):
+        self.find_container = engine.compile_one(spec['container'])
+        self.find_posts = engine.compile_all(spec['posts'])
+        self.drop_last = spec.get('drop_last', 0)
+        self.attr = engine.attr
+
+        self.find_next = engine.compile_one(spec['next_page']) if spec.get('next_page') else None
+        self.find_published = engine.compile_one(spec['published']) if spec.get('published') else None
+
+        # every selector is run once per post, even if several fields use its element
+        selectors = []
+        for field in spec['fields'].values():
+            if 'select' in field and field['select'] not in selectors:
+                selectors.append(field['select'])
+        self.selectors = [engine.compile_one(selector) for selector in selectors]
+
+        self.fields = [
+            (name, compile_field(field, engine, selectors))
+            for name, field in spec['fields'].items()
+        ]
+
+    # ===== [METHOD: Get posts from the page] =====
+    def posts(self, page):
+        posts = self.find_posts( self.find_container(page) )
+
+        if self.drop_last:
+            posts = posts[:-self.drop_last]
+
+        return posts
+
+    # ===== [METHOD: Get article from the post] =====
+    def article(self, post):
+        nodes = [find(post) for find in self.selectors]
+
+        return {name: get(post, nodes) for name, get in self.fields}
+
+    # ===== [METHOD: Get link to the next page of the listing] =====
+    def next_page(self, page):
+        node = self.find_next(page) if self.find_next is not None else None
+
+        return self.attr(node, 'href') if node is not None else None
+
+    # ===== [METHOD: Get publish time of the post (as it's written on the site)] =====
+    def published(self, post):
+        node = self.find_published(post) if self.find_published is not None else None
+
+        return self.attr(node, 'datetime') if node is not None else None
+
+# ===== [CLASS: Details extraction compiled for one engine] =====
+class DetailExtractor:
+    def __init__(self, spec, engine):
+        self.text = engine.text
+        self.attr = engine.attr
+
+        self.fields = [
+            (name, [(engine.compile_one(selector), attr_name) for selector, attr_name in variants])
+            for name, variants in spec.items()
+        ]
+
+    # ===== [METHOD: Get details from the page of the article] =====
+    def details(self, page):
+        details = {}
+
+        for name, variants in self.fields:
+            details[name] = None
+            for find, attr_name in variants:
+                node = find(page)
+                value = None
+                if node is not None:
+                    value = self.attr(node, attr_name) if attr_name else self.text(node)
+
+                if value and value.strip():
+                    details[name] = value.strip()
+                    break
+
+        return details
+
+# ===== [FUNCTION: Compile one field of the spec] =====
+def compile_field(field, engine, selectors):
+    text = engine.text
+    attr = engine.attr
+    parent = engine.parent
+
+    if 'const' in field:
+        value = field['const']
+        if type(value) is list:
+            return lambda post, nodes: list(value) # every article gets its own list
+        return lambda post, nodes: value
+
+    if 'select_all' in field:
+        find_all = engine.compile_all(field['select_all'])
+        labels = field.get('labels')
+
+        if labels:
+            def get(post, nodes):
+                values = [text(node).strip() for node in find_all(post)]
+                return [labels[i] + values[i] for i in range(len(labels))] # IndexError if some are missing
+            return get
+
+        return lambda post, nodes: [text(node).strip() for node in find_all(post)]
+
+    index = selectors.index(field['select'])
+    take_parent = field.get('parent', False)
+    attr_name = field.get('attr')
+    prefix = field.get('prefix', "")
+
+    def get(post, nodes):
+        node = nodes[index]
+        if take_parent:
+            node = parent(node)
+
+        value = attr(node, attr_name) if attr_name else text(node)
+        return prefix + value if prefix else value
+
+    return get
+
+# ===== [FUNCTION: Compile specs of all sites for all installed engines] =====
+def compile_extractors(specs):
+    return {
+        (label, engine_name): Extractor(spec, engine)
+        for label, spec in specs.items()
+        for engine_name, engine in engines.items()
+    }
+
+extractors = compile_extractors(site_specs) # compiled once, when the module is imported
+detail_extractors = {
+    (label, engine_name): DetailExtractor(spec.get('details', detail_specs), engine)
+    for label, spec in site_specs.items()
+    for engine_name, engine in engines.items()
+}
+
+# ===== [FUNCTION: Get extractor of the site for the engine] =====
+def get_extractor(page_label, engine):
+    return extractors[(page_label, engine.name)]
+
+# ===== [FUNCTION: Get details extractor of the site for the engine] =====
+def get_detail_extractor(page_label, engine):
+    return detail_extractors[(page_label, engine.name)]
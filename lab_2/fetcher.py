@@ -0,0 +1,216 @@
+# ===== [IMPORT: Importing external libraries] =====
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+
+# ===== [IMPORT: Importing standard libraries] =====
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import random
+import threading
+import time
+
+
+REQUEST_TIMEOUT = (5, 15) # (connect, read) timeouts in seconds for every upstream request
+POOL_SIZE = 10 # how many keep-alive connections the shared session holds per host
+
+DEFAULT_HOST_LIMIT = 2 # how many requests can go to the same host at once
+host_limits = {} # per-host overrides, e.g. {"www.nn.ru": 1}
+
+# requests are split into channels with their own host slots and breakers,
+# so downloading pages of many articles can't hold back (or break) the refresh of the listing
+LISTINGS = "listings"
+DETAILS = "details"
+channel_host_limits = {DETAILS: 1} # the limit of a channel for every host, listings use host_limits
+
+RETRIES = 2 # extra attempts after a connection error, timeout or 5xx answer
+BACKOFF_BASE = 0.5 # seconds, the pause before attempt N is random in [0, BACKOFF_BASE * 2 ** N]
+BACKOFF_MAX = 8
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+BREAKER_THRESHOLD = 3 # failed fetches in a row (after their retries) after which the host is not requested for a while
+BREAKER_RESET_TIMEOUT = 60 # seconds before one trial request is let through to the host again
+
+_session = None
+_session_lock = threading.Lock()
+
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+#######################################################################################################
+# ===== [EXCEPTION: Base error of fetching] =====
+class FetchError(Exception):
+    def __init__(self, message, url):
+        super().__init__(message)
+        self.url = url
+
+# ===== [EXCEPTION: Upstream didn't answer in time] =====
+class FetchTimeout(FetchError):
+    pass
+
+# ===== [EXCEPTION: Can't connect to upstream] =====
+class FetchConnectionError(FetchError):
+    pass
+
+# ===== [EXCEPTION: Request can't be sent at all (bad URL, bad headers...)] =====
+class InvalidRequestError(FetchError, ValueError):
+    pass
+
+# ===== [EXCEPTION: Upstream answered with a bad status code] =====
+class UpstreamStatusError(FetchError):
+    def __init__(self, message, url, status_code):
+        super().__init__(message, url)
+        self.status_code = status_code
+
+# ===== [EXCEPTION: Host is considered dead, request wasn't sent] =====
+class CircuitOpenError(FetchError):
+    def __init__(self, message, url, retry_after):
+        super().__init__(message, url)
+        self.retry_after = retry_after
+
+# ===== [CLASS: Per-host circuit breaker] =====
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0 # failed fetches in a row
+        self.opened_at = None # time.monotonic() when the breaker was opened
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    # ===== [METHOD: State of the breaker: "closed", "open" or "half-open"] =====
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    # ===== [METHOD: Can a request be sent (returns seconds to wait if not)] =====
+    def acquire(self):
+        with self._lock:
+            state = self.state
+
+            if state == "closed":
+                return 0
+            if state == "half-open":
+                if not self.trial_running:
+                    self.trial_running = True # only one trial request checks if the host is back
+                    return 0
+                return 1.0 # the trial request is still running
+
+            return self.reset_timeout - (time.monotonic() - self.opened_at)
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic() # a failed trial opens the breaker again
+
+# ===== [FUNCTION: Get circuit breaker of the host] =====
+def get_breaker(url, channel=LISTINGS):
+    key = (channel, urlsplit(url).netloc)
+
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker()
+        return _breakers[key]
+
+# ===== [FUNCTION: Get shared HTTP session] =====
+def get_session():
+    global _session
+
+    # one pooled session for the whole process, so connections to the same host are reused
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+
+    return _session
+
+# ===== [FUNCTION: Limit concurrent requests to one host] =====
+@contextmanager
+def host_slot(url, channel=LISTINGS):
+    host = urlsplit(url).netloc
+    key = (channel, host)
+
+    with _host_slots_lock:
+        if key not in _host_slots:
+            limit = channel_host_limits.get(channel, host_limits.get(host, DEFAULT_HOST_LIMIT))
+            _host_slots[key] = threading.BoundedSemaphore(limit)
+        slot = _host_slots[key]
+
+    with slot: # waits while this host already serves its limit of requests
+        yield
+
+# ===== [FUNCTION: Pause before the next attempt] =====
+def backoff(attempt):
+    time.sleep( random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)) ) # full jitter
+
+# ===== [FUNCTION: Did the request (or the reading of its body) time out] =====
+def timed_out(error):
+    # requests wraps a timeout in the middle of the body into ConnectionError
+    return isinstance(error, requests.exceptions.Timeout) or bool(error.args) and isinstance(error.args[0], ReadTimeoutError)
+
+# ===== [FUNCTION: Fetch URL through the shared session] =====
+def fetch(url, headers=None, read=None, timeout=REQUEST_TIMEOUT, retries=RETRIES, channel=LISTINGS):
+    # read(response) reads the body of a 200 answer while the host slot is held, its result is response.body;
+    # a connection which breaks in the middle of the body is retried like the one which breaks before it
+    breaker = get_breaker(url, channel)
+
+    # the breaker is asked once and told once per fetch: retries of one request are one failure, not several
+    wait = breaker.acquire()
+    if wait:
+        raise CircuitOpenError(f"[!] Host of this URL is not answering, next try in {wait:.0f} seconds: {url}\n*[TIP]: The last good snapshot is served meanwhile", url, wait)
+
+    for attempt in range(retries + 1):
+        last_attempt = attempt == retries
+
+        try:
+            with host_slot(url, channel):
+                response = get_session().get(url, headers=headers, stream=read is not None, timeout=timeout)
+
+                if read is not None and response.status_code == 200:
+                    try:
+                        response.body = read(response)
+                    finally:
+                        response.close() # the connection goes back to the pool (or is dropped, if it's broken)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+            if last_attempt:
+                breaker.failure()
+                if timed_out(e):
+                    raise FetchTimeout(f"[!] Timed out while waiting for this URL: {url}\n*[TIP]: The site is too slow right now, try again later!", url)
+                raise FetchConnectionError(f"[!] Can't connect to this URL: {url}\n*[TIP]: Try to check your URL for validity or even check your internet connection status!", url)
+        except requests.exceptions.RequestException:
+            breaker.success() # the host is fine, the request is not
+            raise InvalidRequestError(f"[!] Can't get HTML content by this URL: {url}\n*[TIP]: Try to check your URL for validity!", url)
+        except Exception:
+            breaker.success() # the host has answered, reading of the answer has failed
+            raise
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                breaker.success()
+                return response # every other status is checked by the caller
+
+            response.close()
+            if last_attempt:
+                breaker.failure()
+                raise UpstreamStatusError(f"[!] Site is failing with status_code {response.status_code}: {url}\n*[TIP]: Try again later!", url, response.status_code)
+
+        backoff(attempt)
@@ -0,0 +1,15 @@
+# ===== [GUNICORN CONFIG: Procfile runs `gunicorn --chdir lab_2 -c gunicorn_config.py lab_2:app`] =====
+worker_class = "gthread"
+threads = 100 # /stream takes at most lab_2.stream_max_clients of them, the rest serve normal requests
+
+# the app is imported once in the master process and the workers are forked from it:
+# flask, the templates and the rendered snapshots are shared copy-on-write instead of loaded by every worker
+preload_app = True
+
+
+# ===== [HOOK: Load shared state before the workers are forked] =====
+def when_ready(server):
+    import lab_2
+
+    lab_2.preload()
+    server.log.info("Templates and snapshots are preloaded")
@@ -1,37 +1,87 @@
 # ===== [IMPORT: Importing external libraries] =====
-import requests
-import requests.exceptions
-from requests.models import PreparedRequest
-
-from bs4 import BeautifulSoup
-from flask import Flask, render_template, redirect, url_for, request
+from flask import Flask, Response, render_template, redirect, url_for, request, jsonify, stream_with_context, g
+
+# ===== [IMPORT: Importing local modules] =====
+from scheduler import RefreshScheduler
+from snapshot_cache import SnapshotCache
+from store import ArticleStore, parse_cursor
+from snapshots import write_snapshot, read_snapshot
+from events import Broadcaster, StoreFeed
+from dedup import DuplicateIndex
+from archive import PageArchive
+import metrics
+from metrics import stage_timer, downloaded_bytes, found_articles
 
 # ===== [IMPORT: Importing standard libraries] =====
+from concurrent.futures import ThreadPoolExecutor
+import cProfile
+import gc
+import hashlib
+import io
+import pstats
 import json
 from datetime import datetime, date
 import os.path
 import random
+import threading
+import time
+from urllib.parse import urljoin
 
+# Fetching and parsing (requests, bs4, lxml, selectolax and the compiled selectors) are imported inside the functions
+# which use them: only the worker which refreshes (see scheduler.py) ever loads them.
 
 app = Flask(__name__)
+app.config['REFRESH_SCHEDULER'] = True # refresh sources in the background, switch off to serve snapshots only
+app.config['ENRICHMENT'] = True # download pages of new articles in the background for full description, time and author
+# keep every downloaded page compressed for reextract.py; off by default: pages are downloaded whole then (not up to the container),
+# the archive has no size limit, and on Heroku its files are lost with every restart anyway
+app.config['ARCHIVE'] = False
+app.config['PROFILING'] = False # allow ?profile=1 on any route to get cProfile stats instead of the answer
 
 sites = {
     "lifehacker": [
         "Лайфхакер",
-        "https://lifehacker.ru/topics/news"
+        "https://lifehacker.ru/topics/news",
+        600 # refresh interval in seconds
     ],
     "mailru": [
         "Новости Mail.RU",
-        "https://news.mail.ru/economics/"
+        "https://news.mail.ru/economics/",
+        300
     ],
     "nnru": [
         "Новости NN.RU",
-        "https://www.nn.ru/news/"
+        "https://www.nn.ru/news/",
+        300
     ]
 }
+
+parser_engine = None # name of the parsing engine ("bs4", "lxml", "selectolax"), None is the fastest installed one
+snapshot_format = "compact" # "pretty" and "compact" are json, "binary" is msgpack
+partial_parsing = True # build the DOM only for the container with articles, not for the whole page
+
+store = ArticleStore(os.environ.get("ARTICLES_DB", "articles.db")) # every article ever seen, keyed by link (opened on the first query)
+articles_on_page = 50 # how many of the latest articles are shown on the page of the source
+api_default_limit = 50 # articles per page of the json api
+api_max_limit = 1000
+api_max_age = 30 # seconds the api answers can be cached by clients
+search_default_limit = 20 # results of /search
+search_max_limit = 100
+# every open /stream holds a thread of the worker, the rest of its threads (see gunicorn_config.py) serve normal requests
+stream_max_clients = 50
+stream_slots = threading.BoundedSemaphore(stream_max_clients)
+
+broadcaster = Broadcaster() # new articles for clients connected to /stream
+store_feed = StoreFeed(store, broadcaster)
+duplicates = DuplicateIndex(store) # the same story on several sites gets the same `cluster`
+page_archive = PageArchive(store) # raw pages by their hash
+
+parsed_pages = {} # url -> validators, body hash and articles of the last parsed version of the page
 #######################################################################################################
 # ===== [FUNCTION: Check URL for validity] =====
 def check_url(url):
+    from requests.models import PreparedRequest
+
     prepared_request = PreparedRequest() # create an instance of the PreparedRequest class of the requests library
     try:
         prepared_request.prepare_url(url, None) # checking for the correct of url
@@ -39,8 +89,10 @@ def check_url(url):
     except:
         return False
 
-# ===== [FUNCTION: Get HTML content] =====
-def get_html_page(url):
+# ===== [FUNCTION: Download HTML content] =====
+def download_page(url, headers=None, channel="listings", read=None):
+    from fetcher import fetch, UpstreamStatusError
+
     print("Incoming URL is:", url, "\n")
 
     # Check for the type of input argument
@@ -55,116 +107,53 @@ def get_html_page(url):
     if not check_url(url):
         raise ValueError("[!] Invalid URL!\n*[TIP]: Correct URL consists of: http(s)://domain.name/[path/]")
 
-    # Try to connect and receive content
-    try:
-        url_req = requests.get(url)
-    except requests.exceptions.ConnectionError:
-        raise Exception(f"[!] Can't connect to this URL: {url}\n*[TIP]: Try to check your URL for validity or even check your internet connection status!")
-    except:
-        raise ValueError(f"[!] Can't get HTML content by this URL: {url}\n*[TIP]: Try to check your URL for validity!")
+    # Try to connect and receive content (timeouts, retries and circuit breaker are in fetcher)
+    url_req = fetch(url, headers=headers, read=read, channel=channel) # raises FetchError subclasses, read() gives url_req.body
+
+    # Checking status_code (304 is OK only if we asked for it)
+    if not (url_req.status_code == 200 or (headers and url_req.status_code == 304)):
+        url_req.close()
+        raise UpstreamStatusError(f"[!] status_code is not OK of incoming url: {url}\n*[TIP]: Perhaps you stumbled upon page 404...", url, url_req.status_code)
+
+    return url_req # return for future handling
+
+# ===== [FUNCTION: Get HTML content] =====
+def get_html_page(url):
+    from bs4 import BeautifulSoup
 
-    # Checking status_code
-    if not url_req.status_code == 200:
-        raise Exception(f"[!] status_code is not OK of incoming url: {url}\n*[TIP]: Perhaps you stumbled upon page 404...")
+    url_req = download_page(url)
 
     return BeautifulSoup(url_req.text, "html.parser") # return for future handling
 
 # ===== [FUNCTION: Get all articles and their submitted data] =====
 def find_articles(page, page_label):
-    if type(page) is not BeautifulSoup:
-        raise TypeError(f"[!] Something went wrong! Incoming argument `page` is not what we are expected for.\n*[INPUT]: Incoming argument is not a BS4 type | `page` = {page}")
-
-    params = {
-        'lifehacker': {
-            'container': '.flow .flow__posts',
-            'posts': ['div', 'class', 'flow-post'],
-
-            'heading': '.flow-post__title',
-            'descr': '.flow-post__excerpt',
-            'tags': '.meta-mark span[class^="meta-info"]'
-        },
-        'mailru': {
-            'container': '.paging__content',
-            'posts': ['div', 'class', 'newsitem'],
-
-            'heading': '.cell .newsitem__title',
-            'descr': '.cell .newsitem__text'
-        },
-        'nnru': {
-            'container': '.rn-section_lenta-on-main .rn-info__list',
-            'posts': ['li', 'class', 'rn-info__item'],
-
-            'heading': '.rn-info__announce .rn-info__announce-text'
-        },
-    }
+    from engines import engine_for
+    from extractors import get_extractor
 
-    try:
-        # get a specific container from which we will search for the contents
-        news_container = page.select_one( params[page_label]['container'] )
-        posts = news_container.find_all(
-            params[page_label]['posts'][0],
-            { params[page_label]['posts'][1]: params[page_label]['posts'][2]}
-        )
-        
-        if page_label == 'nnru':
-            del posts[-1]
+    engine = engine_for(page) # the same instructions work for pages built by any parsing engine
+    if engine is None:
+        raise TypeError(f"[!] Something went wrong! Incoming argument `page` is not what we are expected for.\n*[INPUT]: Incoming argument is not a parsed page | `page` = {page}")
 
+    try:
+        extractor = get_extractor(page_label, engine) # compiled from site_specs at startup
     except KeyError:
         raise KeyError(f"[!] There is no instructions for parsing by label: {page_label}!")
+
+    try:
+        # get a specific container from which we will search for the contents
+        posts = extractor.posts(page)
     except:
         raise Exception("[!] HTML page doesn't available!\n*[TIP]: Perhaps the page you need is not that you are looking for")
 
-    articles = []
-    post_heading = post_description = post_link = None
-
     try:
-        for post in posts:
-            # HEADING
-            post_heading = post.select_one( params[page_label]['heading'] )
-
-            # DESCRIPTION
-            if page_label == 'lifehacker' or page_label == 'mailru':
-                post_description = post.select_one( params[page_label]['descr'] ).text
-            elif page_label == 'nnru':
-                post_description = "Описание внутри статьи."
-
-            # LINK
-            if page_label == 'lifehacker' or page_label == 'nnru':
-                post_link = post_heading.parent.get('href')
-            elif page_label == 'mailru':
-                post_link = "https://news.mail.ru/" + post_heading.get('href')
-
-            # TAGS
-            post_tags = []
-            if page_label == 'lifehacker':
-                for tag in post.select( params[page_label]['tags'] ):
-                    post_tags.append( (tag.text).strip() )
-            elif page_label == 'mailru':
-                for tag in post.select_one('.newsitem__params').find_all('span', {'class': 'newsitem__param'}):
-                    post_tags.append( (tag.text).strip() )
-                post_tags = [
-                    "Актуальность: " + post_tags[0],
-                    "Источник: " + post_tags[1]
-                ]
-            elif page_label == 'nnru':
-                post_tags.append("НОВОСТИ НИЖНЕГО НОВГОРОДА")
-
-            articles += [{
-                'title': post_heading.text,
-                'descr': post_description,
-                'link': post_link,
-                'tags': post_tags
-            }]
-            
-    except KeyError:
-        raise KeyError(f"[!] There is no instructions for parsing by label: {page_label}!")
+        articles = [extractor.article(post) for post in posts]
     except:
         raise Exception("[!] Can't parse content!\n*[TIP]: Perhaps DOM structure was changed...")
 
     return articles # return for future handling
 
 # ===== [FUNCTION: Generate a JSON document about the received data] =====
-def generate_json(path, url = "", articles = []):
+def generate_json(path, url = "", articles = [], fmt = "pretty"):
     # Forming a json object
     json_obj = {
         'url': url,
@@ -172,20 +161,329 @@ def generate_json(path, url = "", articles = []):
         'articles': articles
     }
 
-    # Saving data to a json file
-    with open(path, "w", encoding="utf-8") as file:
-        json.dump(json_obj, file, indent = 4, ensure_ascii = False)
+    # Saving data to a json file (or binary one), atomically
+    write_snapshot(path, json_obj, fmt)
 
     return json_obj # return for future handling
 
+# ===== [FUNCTION: Get request headers to download the page only if it was changed] =====
+def conditional_headers(url):
+    known = parsed_pages.get(url, {})
+    headers = {}
+
+    if known.get('etag'):
+        headers['If-None-Match'] = known['etag']
+    if known.get('last_modified'):
+        headers['If-Modified-Since'] = known['last_modified']
+
+    return headers
+
+# ===== [FUNCTION: Read the body of the page (only up to the container with articles if it's possible)] =====
+def read_body(url_req, container):
+    from partial import read_container
+
+    if container is not None:
+        # stops downloading after the container, unless the page is archived: the next DOM can keep articles further down
+        return read_container(url_req, container, whole=app.config['ARCHIVE'])
+
+    return url_req.content, None
+
+# ===== [FUNCTION: Save the downloaded page to the archive] =====
+def archive_page(page_label, url, url_req, body):
+    if app.config['ARCHIVE']:
+        page_archive.put(page_label, url, body, url_req.encoding) # it's stored once, however many times it comes
+
+# ===== [FUNCTION: Build DOM of the downloaded page] =====
+def build_page(body, fragment, container, encoding=None):
+    from engines import get_engine
+
+    engine = get_engine(parser_engine) # the fastest installed engine by default
+    encoding = encoding or "utf-8"
+
+    if fragment is not None:
+        return engine.parse( fragment.decode(encoding, errors="replace") ) # DOM of the container only
+
+    return engine.parse( body.decode(encoding, errors="replace"), only=container )
+
 # ===== [FUNCTION: Parse page] =====
 def parse(url="https://lifehacker.ru/topics/news", page_label = ""):
-    page = get_html_page(url) # getting HTML content of the page
-    articles = find_articles(page, page_label) # grabbing articles from the pages
-    generate_json(page_label + "_"  + "articles.json", url, articles) # generating json with grabbed data
+    from extractors import site_specs
+
+    known = parsed_pages.get(url)
+
+    with stage_timer("fetch", page_label):
+        container = site_specs[page_label]['strain'] if partial_parsing else None
+        url_req = download_page( # getting HTML content of the page
+            url, conditional_headers(url), read=lambda response: read_body(response, container)
+        )
+
+        if url_req.status_code == 304:
+            url_req.close() # nothing to read, the connection goes back to the session pool
+            body = fragment = None
+        else:
+            body, fragment = url_req.body
+            archive_page(page_label, url, url_req, body) # before parsing, so a page which breaks it is kept
+
+    downloaded_bytes.observe(len(body) if body is not None else 0, source=page_label)
+
+    with stage_timer("parse", page_label):
+        if body is None:
+            articles = known['articles'] # nothing was changed since the last time
+        else:
+            body_hash = hashlib.sha1(fragment if fragment is not None else body).hexdigest() # the rest doesn't change articles
+
+            if known is not None and known['hash'] == body_hash:
+                articles = known['articles'] # the site doesn't support validators, but the body is the same
+            else:
+                page = build_page(body, fragment, container, url_req.encoding)
+                articles = find_articles(page, page_label) # grabbing articles from the pages
+
+            # validators are remembered only after successful parsing
+            parsed_pages[url] = {
+                'etag': url_req.headers.get('ETag'),
+                'last_modified': url_req.headers.get('Last-Modified'),
+                'hash': body_hash,
+                'articles': articles
+            }
+
+    found_articles.observe(len(articles), source=page_label)
+
+    with stage_timer("dedup", page_label):
+        duplicates.assign(articles) # only new links are hashed and compared
+
+    with stage_timer("write", page_label):
+        store.add(page_label, url, articles) # only new and changed articles are written
+        generate_json(snapshot_path(page_label), url, articles, snapshot_format) # generating json with grabbed data
+
+    store_feed.wake() # new articles are pushed to connected clients right away
+    enrich(page_label, articles)
+
+    return articles # return for future handling
+
+# ===== [FUNCTION: Parse one page of the listing for the crawler] =====
+def parse_listing(url, page_label):
+    from engines import engine_for
+    from extractors import site_specs, get_extractor
+
+    container = site_specs[page_label]['strain'] if partial_parsing else None
+    url_req = download_page(url, read=lambda response: read_body(response, container))
+
+    body, fragment = url_req.body
+    archive_page(page_label, url, url_req, body)
+    page = build_page(body, fragment, container, url_req.encoding)
+    articles = find_articles(page, page_label)
+
+    extractor = get_extractor(page_label, engine_for(page))
+    published = [extractor.published(post) for post in extractor.posts(page)]
+    next_url = extractor.next_page(page)
+
+    return articles, published, urljoin(url, next_url) if next_url else None
+
+# ===== [FUNCTION: Get details from the page of the article] =====
+def parse_details(link, page_label):
+    from engines import get_engine, engine_for
+    from extractors import get_detail_extractor
+
+    url_req = download_page(link, channel="details") # own host slots and breaker, the listings don't wait for them
+    page = get_engine(parser_engine).parse(url_req.text) # details are in <head> and all over the page
+
+    return get_detail_extractor(page_label, engine_for(page)).details(page)
+
+# ===== [FUNCTION: Queue new articles for enrichment] =====
+def enrich(page_label, articles):
+    global enricher
+
+    if not app.config['ENRICHMENT']:
+        return
+
+    with enricher_lock:
+        if enricher is None: # the first refresh creates it (and its threads)
+            from enricher import Enricher
+            enricher = Enricher(store, parse_details, on_enriched=snapshot_cache.invalidate)
+
+    enricher.submit(page_label, [article['link'] for article in articles]) # doesn't wait for the downloads
+
+# ===== [FUNCTION: Crawl the source deeper than the first page] =====
+def crawl_source(page_label, pages=None, until=None):
+    from crawler import crawl, CRAWL_PAGES
+    from extractors import site_specs
+
+    pages = CRAWL_PAGES if pages is None else pages
+    url = sites[page_label][1]
+
+    result = crawl(
+        url, lambda page_url: parse_listing(page_url, page_label), pages, until,
+        is_known = store.known, # stops at the pages crawled before
+        page_url = site_specs[page_label].get('page_url')
+    )
+    articles = result.pop('articles')
+    first_page = result.pop('first_page')
+    duplicates.assign(articles)
+
+    # the first page is what the usual refresh sees, the deeper articles are older than anything stored
+    counts = store.add(page_label, url, articles[:first_page])
+    oldest = store.oldest(page_label)
+    backfill = store.add(
+        page_label, url, articles[first_page:], first_seen = oldest - 1 if oldest is not None else None,
+        live = False # clients get them with the history, not as new articles at the top of the page
+    )
+
+    result['articles'] = len(articles)
+    result['new'] = counts['new'] + backfill['new']
+    snapshot_cache.invalidate(page_label)
+    store_feed.wake()
+    enrich(page_label, articles)
+
+    return result # return for future handling
+
+# ===== [FUNCTION: Start crawling of the source in the background (once at a time)] =====
+def start_crawl(page_label, pages, until):
+    with crawl_lock:
+        job = crawl_jobs.get(page_label)
+        if job is not None and not job['future'].done():
+            return job # the source is being crawled already, the new request joins it
+
+        job = {
+            'source': page_label,
+            'pages': pages,
+            'until': until.strftime("%Y-%m-%d") if until is not None else None,
+            'started': time.time(),
+            'future': crawl_pool.submit(crawl_source, page_label, pages, until)
+        }
+        crawl_jobs[page_label] = job
+
+    return job # return for future handling
+
+# ===== [FUNCTION: Get status of the crawl] =====
+def crawl_status(job):
+    status = {name: value for name, value in job.items() if name != 'future'}
+    future = job['future']
+
+    if not future.done():
+        status['state'] = "running"
+    elif future.exception() is not None:
+        status['state'] = "failed"
+        status['error'] = f"{type(future.exception()).__name__}: {future.exception()}"
+    else:
+        status['state'] = "done"
+        status['result'] = future.result() # pages, new articles and why the crawl stopped
+
+    return status
+
+# ===== [FUNCTION: Get path of the snapshot] =====
+def snapshot_path(page_label):
+    return page_label + "_" + ("articles.bin" if snapshot_format == "binary" else "articles.json")
+
+# ===== [FUNCTION: Get modification time of the snapshot] =====
+def snapshot_mtime(page_label):
+    try:
+        return os.path.getmtime( snapshot_path(page_label) )
+    except OSError:
+        return None # there is no snapshot yet
+
+# ===== [FUNCTION: Get time of the last change of the source in the store] =====
+def store_version(page_label):
+    return store.version(page_label)
+
+# ===== [FUNCTION: Get age of the snapshot in seconds] =====
+def snapshot_age(page_label):
+    mtime = snapshot_mtime(page_label)
+    return None if mtime is None else time.time() - mtime
+
+# ===== [FUNCTION: Render the page with articles of the source] =====
+def render_articles(page_label, refreshing):
+    source_info = store.source_info(page_label)
+
+    if source_info is not None:
+        articles_info = {
+            'url': source_info['url'],
+            'creationDate': datetime.fromtimestamp(source_info['refreshed_at']).strftime("%d-%m-%Y [%H:%M:%S]"),
+            'articles': store.latest(page_label, articles_on_page) # only the newest part of the history
+        }
+    # if the store is empty, but lifehacker_articles.json exists, it's the snapshot from the previous version
+    elif os.path.isfile( snapshot_path(page_label) ):
+        articles_info = read_snapshot( snapshot_path(page_label) ) # loading articles from json file, the format is detected
+    else:
+        articles_info = {
+            'url': sites[page_label][1],
+            'creationDate': "—",
+            'articles': []
+        }
+
+    page_info = {
+        'label': page_label,
+        'title': sites[page_label][0],
+        'updated': snapshot_mtime(page_label), # the age is counted in the browser, so the page can be cached
+        'refreshing': refreshing
+    }
+
+    return render_template('articles.html', articles = articles_info, page = page_info) # render our html page with articles data
+
+snapshot_cache = SnapshotCache(snapshot_mtime, render_articles, store_version)
+# only the gunicorn worker which holds the lock refreshes, the others pass their requests to it
+scheduler = RefreshScheduler(
+    sites, parse, snapshot_age, on_refresh=snapshot_cache.invalidate, lock_path=os.environ.get("REFRESH_LOCK", "refresh.lock")
+)
+enricher = None # created by the first enrich()
+enricher_lock = threading.Lock()
+
+# crawls take minutes (a pause after every page), so they run in the background, one per source
+crawl_pool = ThreadPoolExecutor(max_workers=len(sites), thread_name_prefix="crawl") # threads start with the first crawl
+crawl_jobs = {} # label -> the last crawl of the source in this worker
+crawl_lock = threading.Lock()
+
+# ===== [FUNCTION: Prepare shared state before gunicorn forks the workers (see gunicorn_config.py)] =====
+def preload():
+    # templates are compiled and the snapshots rendered once in the master process,
+    # forked workers share this memory copy-on-write instead of loading it on their first hit
+    for template in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template)
+
+    for page_label in sites:
+        with app.test_request_context("/" + page_label):
+            snapshot_cache.get(page_label, False)
+
+    store.close() # sqlite connections can't cross fork, every worker opens its own
+    gc.freeze() # the garbage collector never touches the preloaded objects, so their memory stays shared
+
+# ===== [FUNCTION: Start background refreshing once] =====
+def ensure_scheduler():
+    if app.config['REFRESH_SCHEDULER']:
+        scheduler.start() # does nothing if it's already running
 
 #######################################################################################################
 
+# ===== [HOOK: Start timing (and profiling) of the request] =====
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profiler = None
+
+    if app.config['PROFILING'] and request.args.get('profile') == "1":
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+# ===== [HOOK: Record time of the request] =====
+@app.after_request
+def stop_request_timer(response):
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.request_seconds.observe(
+        time.perf_counter() - g.request_started, route=route, method=request.method, status=response.status_code
+    )
+
+    if g.get('profiler') is not None:
+        g.profiler.disable()
+        stats_text = io.StringIO()
+        pstats.Stats(g.profiler, stream=stats_text).sort_stats("cumulative").print_stats(40)
+        return Response(stats_text.getvalue(), mimetype="text/plain")
+
+    return response
+
+# ===== [ROUTE: Metrics in Prometheus format] =====
+@app.route('/metrics', methods=["GET"])
+def metrics_page():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
 # ===== [ROUTE: Root page] =====
 @app.route('/', methods=["GET"])
 def main():
@@ -197,36 +495,219 @@ def main():
 @app.route('/nnru', methods=["GET"])
 def page_handler():
     current_page = request.path.split('/')[1]
+    ensure_scheduler()
 
-    # if lifehacker_articles.json doesn't exists
-    if not os.path.isfile(current_page + "_articles.json"):
-        try:
-            parse( sites[current_page][1], current_page) # trying to parse site by url, which is in: sites array, by current_page
-        except KeyError:
-            raise KeyError(f"[!] Can't get URL in sites array, searching by key `{current_page}`")
-    
-    with open(current_page + "_" + "articles.json", "r", encoding="utf-8") as file:
-        articles_info = json.load(file) # loading articles from json file
+    # the page is rendered only once per snapshot, then it's served from memory
+    cached = snapshot_cache.get(current_page, scheduler.is_refreshing(current_page))
 
-    page_info = {
-        'label': current_page,
-        'title': sites[current_page][0]
-    }
+    response = Response(cached.body, mimetype="text/html")
+    response.set_etag(cached.etag)
+    response.last_modified = cached.last_modified
+    response.cache_control.no_cache = True # browser has to revalidate, but gets 304 if nothing changed
 
-    return render_template('articles.html', articles = articles_info, page = page_info) # render our html page with articles data
+    return response.make_conditional(request)
 
 # ===== [ROUTE: Refresh handler] =====
 @app.route('/update', methods=["POST"])
 def refresh():
     src = request.form['src'] #parse()
+    ensure_scheduler()
 
-    try:
-        parse( sites[src][1], src) # trying to parse site by url, which is in: sites array, by key: src
-    except KeyError:
-        raise KeyError(f"[!] There's no site in sites array, searching by key `{src}`")
+    scheduler.request(src) # queued in the background, a click during a running refresh joins it
 
     return redirect(request.url_root + src) #url_for('page_handler'))
 
+# ===== [ROUTE: Refresh all sources handler] =====
+@app.route('/update/all', methods=["POST"])
+def refresh_every_source():
+    ensure_scheduler()
+
+    results = {}
+    for label in sites:
+        scheduler.request(label) # the same queue as /update, so parallel clicks don't start parallel refreshes
+        results[label] = {
+            'refreshing': scheduler.is_refreshing(label),
+            'last_result': scheduler.last_results.get(label) # timing and error of the previous refresh (the refreshing worker knows it)
+        }
+
+    return jsonify(results), 202
+
+# ===== [ROUTE: Crawl handler] =====
+@app.route('/crawl', methods=["POST"])
+def crawl_handler():
+    from crawler import CRAWL_PAGES, CRAWL_MAX_PAGES # the crawl runs in this worker
+
+    src = request.form.get('src')
+    if src not in sites:
+        return jsonify({'error': f"[!] There's no site in sites array, searching by key `{src}`"}), 404
+
+    try:
+        pages = int(request.form.get('pages', CRAWL_PAGES))
+        until = request.form.get('until') or None
+        if until is not None:
+            until = datetime.strptime(until, "%Y-%m-%d") # articles published before this day are not taken
+    except ValueError:
+        return jsonify({'error': "[!] `pages` should be a number and `until` a date like 2019-10-23"}), 400
+
+    job = start_crawl(src, max(1, min(pages, CRAWL_MAX_PAGES)), until)
+
+    response = jsonify(crawl_status(job))
+    response.status_code = 202
+    response.headers['Location'] = url_for('crawl_progress', page_label=src)
+
+    return response
+
+# ===== [ROUTE: Status of the crawl] =====
+@app.route('/crawl/<page_label>', methods=["GET"])
+def crawl_progress(page_label):
+    job = crawl_jobs.get(page_label)
+    if job is None:
+        return jsonify({'error': f"[!] The source `{page_label}` wasn't crawled by this worker"}), 404
+
+    return jsonify(crawl_status(job))
+
+# ===== [FUNCTION: Stream one page of articles as json] =====
+def stream_articles(source):
+    try:
+        limit = int(request.args.get('limit', api_default_limit))
+    except ValueError:
+        return jsonify({'error': "[!] `limit` should be a number"}), 400
+    limit = max(1, min(limit, api_max_limit))
+
+    cursor = request.args.get('cursor') or None
+    if cursor is not None:
+        try:
+            parse_cursor(cursor) # checked before streaming, later it's too late to answer 400
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    # the answer changes only when the source is refreshed, so polling clients get 304
+    etag = f"{source or 'all'}-{store.version(source)}-{limit}-{cursor}"
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        def generate():
+            yield '{"articles":['
+
+            next_cursor, count = None, 0
+            for article, next_cursor in store.iter_page(source, limit, cursor):
+                yield ("," if count else "") + json.dumps(article, ensure_ascii=False)
+                count += 1
+
+            if count < limit:
+                next_cursor = None # that was the last page
+            yield '],"count":' + str(count) + ',"next_cursor":' + json.dumps(next_cursor) + '}'
+
+        response = Response(stream_with_context(generate()), mimetype="application/json")
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = api_max_age
+
+    return response
+
+# ===== [ROUTE: Articles of one source (json api)] =====
+@app.route('/api/<page_label>/articles', methods=["GET"])
+def api_source_articles(page_label):
+    if page_label not in sites:
+        return jsonify({'error': f"[!] There's no site in sites array, searching by key `{page_label}`"}), 404
+
+    return stream_articles(page_label)
+
+# ===== [ROUTE: Articles of all sources (json api)] =====
+@app.route('/api/articles', methods=["GET"])
+def api_articles():
+    return stream_articles(None) # merged and sorted by the time they were first seen
+
+# ===== [ROUTE: Full-text search over the articles of all sources] =====
+@app.route('/search', methods=["GET"])
+def search_articles():
+    text = request.args.get('q', "").strip()
+    if not text:
+        return jsonify({'error': "[!] Search query `q` is empty"}), 400
+
+    source = request.args.get('source') or None
+    if source is not None and source not in sites:
+        return jsonify({'error': f"[!] There's no site in sites array, searching by key `{source}`"}), 404
+
+    try:
+        limit = int(request.args.get('limit', search_default_limit))
+    except ValueError:
+        return jsonify({'error': "[!] `limit` should be a number"}), 400
+    limit = max(1, min(limit, search_max_limit))
+
+    started = time.perf_counter()
+    try:
+        articles = store.search(text, source, limit) # ranked by bm25, titles weigh more
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+
+    response = jsonify({
+        'query': text,
+        'count': len(articles),
+        'articles': articles,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+    })
+    response.cache_control.public = True
+    response.cache_control.max_age = api_max_age
+
+    return response
+
+# ===== [ROUTE: Stream of new articles (server-sent events)] =====
+@app.route('/stream', methods=["GET"])
+def stream():
+    source = request.args.get('source') or None # one source or all of them
+    if source is not None and source not in sites:
+        return jsonify({'error': f"[!] There's no site in sites array, searching by key `{source}`"}), 404
+
+    if not stream_slots.acquire(blocking=False):
+        # EventSource doesn't reconnect after an error, the page keeps working without live updates
+        response = jsonify({'error': "[!] Too many open streams!\n*[TIP]: Reload the page later to get new articles"})
+        response.status_code = 503
+        response.headers['Retry-After'] = "60"
+        return response
+
+    ensure_scheduler()
+    store_feed.start()
+
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', broadcaster.last_id))
+    except ValueError:
+        last_id = broadcaster.last_id
+
+    def generate():
+        nonlocal last_id
+
+        yield "retry: 5000\n\n"
+
+        # a reconnected client gets what it missed straight from the store
+        while last_id < broadcaster.last_id:
+            missed = store.added_since(last_id)
+            if not missed:
+                break
+            for event_id, article in missed:
+                if source is None or article['source'] == source:
+                    yield f"id: {event_id}\nevent: article\ndata: {json.dumps(article, ensure_ascii=False)}\n\n"
+            last_id = missed[-1][0]
+
+        while True:
+            events = broadcaster.wait(last_id)
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+
+            for event_id, event_source, message in events:
+                if source is None or event_source == source:
+                    yield message
+            last_id = events[-1][0]
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.call_on_close(stream_slots.release) # the server closes the response when the client is gone
+    response.headers['Cache-Control'] = "no-cache"
+    response.headers['X-Accel-Buffering'] = "no" # nginx (and heroku router) shouldn't buffer the stream
+
+    return response
+
 # ===== [ROUTE: 404 handler] =====
 @app.errorhandler(404)
 def page_not_found(e):
@@ -240,8 +721,8 @@ if __name__ == '__main__': # if the program is launched directly from console
     #URL = "https://lifehacker.ru/topics/news"
     #parse(URL)
     #print("Parse done!")
-    
+
     print("Running server...")
     app.run(port=8000, debug=True) # running a server on port 8000 with debug mode
-    
+
     print("\n===== [PROGRAM FINISHED] =====")
\ No newline at end of file
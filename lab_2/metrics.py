@@ -0,0 +1,138 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30) # seconds
+SIZE_BUCKETS = (1024, 10240, 51200, 102400, 262144, 524288, 1048576, 4194304) # bytes
+COUNT_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 500) # articles
+#######################################################################################################
+# ===== [FUNCTION: Format labels in Prometheus text format] =====
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+
+    escaped = (
+        f'{name}="' + str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+# ===== [CLASS: Counter] =====
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {} # label values -> number
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield self.name + format_labels(self.labels, key), value
+
+# ===== [CLASS: Histogram] =====
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {} # label values -> [counts per bucket (+Inf is the last one), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value) # the first bucket with le >= value
+
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in sorted(self._values.items())]
+
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield self.name + "_bucket" + format_labels(self.labels, key, ("le", le)), cumulative
+            yield self.name + "_sum" + format_labels(self.labels, key), total
+            yield self.name + "_count" + format_labels(self.labels, key), cumulative
+
+# ===== [CLASS: Registry of all metrics] =====
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    # ===== [METHOD: Render all metrics in Prometheus text format] =====
+    def render(self):
+        lines = []
+
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+#######################################################################################################
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "crawler_stage_seconds", "Time of one stage of the refresh pipeline (fetch, parse, write)", ["stage", "source"]
+)
+downloaded_bytes = registry.histogram(
+    "crawler_downloaded_bytes", "Bytes of the page downloaded by one refresh", ["source"], SIZE_BUCKETS
+)
+found_articles = registry.histogram(
+    "crawler_articles", "Articles found by one refresh", ["source"], COUNT_BUCKETS
+)
+errors_total = registry.counter(
+    "crawler_errors_total", "Failed stages of the refresh pipeline by exception type", ["stage", "source", "exception"]
+)
+request_seconds = registry.histogram(
+    "http_request_seconds", "Time of Flask request handling", ["route", "method", "status"]
+)
+
+# ===== [FUNCTION: Time one stage of the pipeline and count its errors] =====
+@contextmanager
+def stage_timer(stage, source):
+    started = time.perf_counter()
+
+    try:
+        yield
+    except Exception as e:
+        errors_total.inc(stage=stage, source=source, exception=type(e).__name__)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, stage=stage, source=source)
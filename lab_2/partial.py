@@ -0,0 +1,78 @@
+# ===== [IMPORT: Importing standard libraries] =====
+import re
+
+
+CHUNK_SIZE = 16 * 1024 # bytes of the response body read at once
+START_OVERLAP = 4096 # bytes of the previous chunk searched again, so the container tag split between chunks is found
+#######################################################################################################
+# ===== [CLASS: Cut the container element out of the HTML while it's being downloaded] =====
+class ContainerSlicer:
+    def __init__(self, container_class):
+        class_name = re.escape(container_class.encode("utf-8"))
+
+        # opening tag which has `container_class` among its classes
+        self.start_re = re.compile(
+            rb'<([a-zA-Z][\w]*)\b[^>]*?\sclass\s*=\s*["\'](?:[^"\']*\s)?' + class_name + rb'(?:\s[^"\']*)?["\'][^>]*>'
+        )
+        self.tag_re = None # opening and closing tags with the same name as the container
+
+        self.buffer = bytearray()
+        self.start = None # where the container begins in the buffer
+        self.end = None # where it ends
+        self.depth = 0
+        self.position = 0 # where to continue searching from
+
+    # ===== [METHOD: Add the next chunk, returns True when the container is complete] =====
+    def feed(self, chunk):
+        if self.end is not None:
+            return True
+
+        self.buffer += chunk
+
+        if self.start is None:
+            found = self.start_re.search(self.buffer, self.position)
+            if found is None:
+                self.position = max(0, len(self.buffer) - START_OVERLAP)
+                return False
+
+            self.start = found.start()
+            self.position = found.end()
+            self.depth = 1
+            self.tag_re = re.compile(rb'<(/?)' + found.group(1) + rb'\b[^>]*>', re.IGNORECASE)
+
+        # count nested tags of the same name until the container is closed
+        for tag in self.tag_re.finditer(self.buffer, self.position):
+            self.position = tag.end()
+            self.depth += -1 if tag.group(1) else 1
+
+            if self.depth == 0:
+                self.end = tag.end()
+                return True
+
+        return False
+
+    # ===== [PROPERTY: Downloaded part of the page] =====
+    @property
+    def consumed(self):
+        return bytes(self.buffer)
+
+    # ===== [PROPERTY: HTML of the container, None if it wasn't found] =====
+    @property
+    def fragment(self):
+        if self.end is None:
+            return None
+
+        return bytes(self.buffer[self.start:self.end])
+
+# ===== [FUNCTION: Read the response only up to the end of the container (or whole, with the container cut out)] =====
+def read_container(response, container_class, whole=False):
+    slicer = ContainerSlicer(container_class)
+    chunks = response.iter_content(CHUNK_SIZE)
+
+    for chunk in chunks:
+        if slicer.feed(chunk):
+            break
+
+    rest = b"".join(chunks) if whole else b"" # without `whole` the rest of the page (scripts, footer) is never downloaded
+    response.close()
+    return slicer.consumed + rest, slicer.fragment
@@ -0,0 +1,81 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from multiprocessing import Pool
+import argparse
+import os
+import sys
+import time
+
+# ===== [IMPORT: Importing local modules] =====
+from archive import PageArchive, ARCHIVE_DIR
+from extractors import site_specs
+import lab_2
+
+
+PROGRESS_EVERY = 100 # pages between two progress lines
+_archive = None # archive opened by the worker process
+#######################################################################################################
+# ===== [FUNCTION: Open the archive in the worker process] =====
+def init_worker(directory):
+    global _archive
+    _archive = PageArchive(None, directory) # workers only read files, the store is written by the main process
+
+# ===== [FUNCTION: Extract articles from one archived page (runs in a worker)] =====
+def extract(page):
+    try:
+        body = _archive.get(page['hash'])
+        container = site_specs[page['source']]['strain'] if lab_2.partial_parsing else None
+
+        parsed = lab_2.build_page(body, None, container, page['encoding'])
+        return page, lab_2.find_articles(parsed, page['source']), None
+    except Exception as e: # one broken page should not stop the whole run
+        return page, [], f"{type(e).__name__}: {e}"
+
+# ===== [FUNCTION: Extract articles from the whole archive again] =====
+def reextract(store, duplicates, directory=ARCHIVE_DIR, source=None, processes=None, progress=None):
+    pages = store.pages(source) # the oldest first, so the newest version of an article is the one left
+    result = {
+        'pages': len(pages),
+        'articles': 0,
+        'new': 0,
+        'errors': 0,
+        'elapsed': 0.0,
+        'pages_per_second': 0.0
+    }
+    started = time.perf_counter()
+
+    with Pool(processes or os.cpu_count(), initializer=init_worker, initargs=(directory,)) as pool:
+        # pages are parsed on all cores, the results come back in order and go to the store one by one
+        for done, (page, articles, error) in enumerate(pool.imap(extract, pages, chunksize=4), 1):
+            if error is not None:
+                result['errors'] += 1
+                print(f"[!] Can't extract articles from {page['source']} page {page['hash']}: {error}", file=sys.stderr)
+            elif articles:
+                duplicates.assign(articles)
+                # the articles found only now are old, they are not pushed to /stream clients as new
+                counts = store.add(page['source'], page['url'], articles, seen_at=page['last_fetched'], live=False)
+                result['articles'] += len(articles)
+                result['new'] += counts['new']
+
+            if progress is not None and done % PROGRESS_EVERY == 0:
+                progress(done, len(pages), done / (time.perf_counter() - started))
+
+    result['elapsed'] = round(time.perf_counter() - started, 3)
+    result['pages_per_second'] = round(len(pages) / result['elapsed'], 1) if result['elapsed'] else 0.0
+
+    return result # return for future handling
+
+# --------------- [ENTRY POINT] ---------------
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description="Extract articles from the archived pages again with the current find_articles")
+    arguments.add_argument("--source", choices=list(lab_2.sites), help="only the pages of this source")
+    arguments.add_argument("--processes", type=int, help="worker processes (default: all cores)")
+    arguments.add_argument("--archive", default=ARCHIVE_DIR, help=f"archive directory (default: {ARCHIVE_DIR})")
+    args = arguments.parse_args()
+
+    def show_progress(done, total, rate):
+        print(f"{done}/{total} pages, {rate:.1f} pages/sec", file=sys.stderr)
+
+    result = reextract(lab_2.store, lab_2.duplicates, args.archive, args.source, args.processes, show_progress)
+
+    print(f"Pages: {result['pages']} ({result['errors']} failed) | articles: {result['articles']} ({result['new']} new)")
+    print(f"Done in {result['elapsed']} s: {result['pages_per_second']} pages/sec")
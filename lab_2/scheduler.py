@@ -0,0 +1,226 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+
+# file locks exist on Linux and macOS only, without them every process refreshes by itself
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+DEFAULT_INTERVAL = 600 # seconds between two refreshes of a source, if `sites` doesn't set its own
+LEADER_RETRY = 5 # seconds between two tries of a waiting process to take over refreshing
+REQUEST_POLL = 1 # seconds between two checks for refreshes asked by other processes
+#######################################################################################################
+# ===== [FUNCTION: Refresh one source and time it] =====
+def refresh_source(parse, label, url):
+    started = time.perf_counter()
+    result = {
+        'label': label,
+        'url': url,
+        'ok': False,
+        'articles': 0,
+        'elapsed': 0.0,
+        'error': None
+    }
+
+    try:
+        articles = parse(url, label)
+        result['ok'] = True
+        result['articles'] = len(articles)
+    except Exception as e: # one broken source should not break the whole refresh
+        result['error'] = f"{type(e).__name__}: {e}"
+
+    result['elapsed'] = round(time.perf_counter() - started, 4)
+    return result
+
+# ===== [CLASS: Background refresh scheduler] =====
+class RefreshScheduler:
+    def __init__(self, sites, parse, snapshot_age=None, on_refresh=None, default_interval=DEFAULT_INTERVAL, lock_path=None):
+        self.sites = sites # {label: [title, url, (interval)]}
+        self.parse = parse # parse(url, label) -> articles
+        self.snapshot_age = snapshot_age # snapshot_age(label) -> seconds or None, used to plan the refreshes
+        self.on_refresh = on_refresh # on_refresh(label) is called after every successful refresh
+        self.default_interval = default_interval
+        # gunicorn workers share one lock file: only the process which holds it refreshes,
+        # the others leave their requests next to it (lock_path + "." + label). None - there's only one process
+        self.lock_path = lock_path
+
+        self.leader = False # this process refreshes the sources
+        self.last_results = {} # label -> result of the last finished refresh
+
+        self._jobs = {} # label -> future of the refresh which is queued or running right now
+        self._due = {} # label -> time.monotonic() of the next planned refresh
+        self._lock = threading.Lock()
+        self._leader_lock = threading.Lock()
+        self._lock_file = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pool = None
+
+    # ===== [METHOD: Refresh interval of the source] =====
+    def interval(self, label):
+        info = self.sites[label]
+        return info[2] if len(info) > 2 else self.default_interval
+
+    # ===== [METHOD: Path of the file which marks an asked or running refresh of the source] =====
+    def request_path(self, label):
+        return None if self.lock_path is None else self.lock_path + "." + label
+
+    # ===== [METHOD: Is the source being refreshed right now (by any process)] =====
+    def is_refreshing(self, label):
+        with self._lock:
+            job = self._jobs.get(label)
+            if job is not None and not job.done():
+                return True
+
+        marker = self.request_path(label)
+        return marker is not None and os.path.exists(marker)
+
+    # ===== [METHOD: Take the lock and become the refreshing process] =====
+    def _take_lock(self):
+        with self._leader_lock:
+            if self.leader:
+                return True
+
+            if self.lock_path is not None and fcntl is not None:
+                lock_file = open(self.lock_path, "a")
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return False # another process holds it
+                self._lock_file = lock_file # the lock lives as long as the file is open (or the process)
+
+            self.leader = True
+
+        self._plan() # ages of the snapshots tell when the previous refreshing process has refreshed
+        self._wakeup.set()
+        return True
+
+    # ===== [METHOD: Plan the next refresh of every source by age of its snapshot] =====
+    def _plan(self):
+        now = time.monotonic()
+        with self._lock:
+            for label in self.sites:
+                age = self.snapshot_age(label) if self.snapshot_age else None
+                # a missing snapshot is refreshed right away, an existing one when it gets old
+                self._due[label] = now if age is None else now + max(0, self.interval(label) - age)
+
+    # ===== [METHOD: Ask for a refresh of the source] =====
+    def request(self, label):
+        if label not in self.sites:
+            raise KeyError(f"[!] There's no site in sites array, searching by key `{label}`")
+
+        if not self._take_lock():
+            # another process refreshes, it finds the request within REQUEST_POLL seconds
+            with open(self.request_path(label), "a"):
+                pass
+            return None
+
+        with self._lock:
+            job = self._jobs.get(label)
+            if job is not None and not job.done():
+                return job # the same refresh is already queued, so the new request joins it
+
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=len(self.sites), thread_name_prefix="scheduler")
+
+            job = self._pool.submit(self._refresh, label)
+            self._jobs[label] = job
+            self._due[label] = time.monotonic() + self.interval(label)
+
+        return job
+
+    # ===== [METHOD: Refresh the source and remember the result] =====
+    def _refresh(self, label):
+        marker = self.request_path(label)
+        if marker is not None:
+            with open(marker, "a"): # other processes see the refresh too
+                pass
+
+        try:
+            result = refresh_source(self.parse, label, self.sites[label][1])
+        finally:
+            if marker is not None:
+                try:
+                    os.remove(marker) # requests which came during the refresh are answered by it
+                except FileNotFoundError:
+                    pass
+
+        self.last_results[label] = result
+
+        if result['ok'] and self.on_refresh:
+            self.on_refresh(label)
+
+        return result
+
+    # ===== [METHOD: Start the background thread] =====
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+
+        self._take_lock() # the waiting processes try again in the loop
+        self._thread.start()
+
+    # ===== [METHOD: Stop the background thread] =====
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+        with self._leader_lock:
+            if self._lock_file is not None:
+                self._lock_file.close() # another process takes over
+                self._lock_file = None
+            self.leader = False
+
+    # ===== [METHOD: Scheduler loop] =====
+    def _run(self):
+        while not self._stopped.is_set():
+            if not self._take_lock():
+                # another process refreshes the sources, this one takes over if that process exits
+                self._wakeup.wait(timeout=LEADER_RETRY)
+                self._wakeup.clear()
+                continue
+
+            now = time.monotonic()
+            with self._lock:
+                due = [label for label, at in self._due.items() if at <= now]
+
+            for label in due:
+                if self.is_refreshing(label):
+                    # the refresh takes longer than its interval, this round is skipped
+                    with self._lock:
+                        self._due[label] = now + self.interval(label)
+                else:
+                    self.request(label)
+
+            if self.lock_path is not None:
+                for label in self.sites:
+                    if os.path.exists(self.request_path(label)):
+                        self.request(label) # asked by another process (or left by a refreshing process which died)
+
+            with self._lock:
+                next_run = min(self._due.values(), default=now + self.default_interval)
+
+            timeout = max(0, next_run - time.monotonic())
+            if self.lock_path is not None:
+                timeout = min(timeout, REQUEST_POLL)
+
+            self._wakeup.wait(timeout=timeout)
+            self._wakeup.clear()
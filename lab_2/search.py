@@ -0,0 +1,37 @@
+# ===== [IMPORT: Importing standard libraries] =====
+import re
+
+
+MIN_STEM = 3 # letters left after the ending is cut off, shorter words are searched as they are
+MAX_TERMS = 10 # words of the query which are searched, the rest are ignored
+
+# Endings of russian nouns, adjectives and verbs, the longest ones are tried first.
+# It's not a real stemmer: the rest of the word is searched as a prefix, so "банков" finds "банки" and "банкам".
+ENDINGS = sorted([
+    "иями", "ями", "ами", "иях", "ях", "ах", "ием", "ям", "ам", "ом", "ем", "ой", "ей", "ев", "ов", "ию", "ью",
+    "ия", "ья", "ие", "ье", "ии", "ьи", "ую", "юю", "ая", "яя", "ое", "ее", "ые", "ый", "ий", "ого", "его",
+    "ому", "ему", "ыми", "ими", "ых", "их", "ешь", "ете", "ишь", "ите", "ует", "уют", "ают", "яют", "ет", "ит",
+    "ут", "ют", "ать", "ять", "ить", "еть", "ла", "ло", "ли",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й"
+], key=len, reverse=True)
+
+WORD = re.compile(r"\w+")
+#######################################################################################################
+# ===== [FUNCTION: Bring the text to the form it is indexed in] =====
+def normalize(text):
+    return text.lower().replace("ё", "е") # sqlite folds the case, but not "ё"
+
+# ===== [FUNCTION: Cut the ending off the russian word] =====
+def stem(word):
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+
+    return word
+
+# ===== [FUNCTION: Build FTS5 query from the text typed by the user] =====
+def build_match(text):
+    words = WORD.findall( normalize(text) )[:MAX_TERMS]
+
+    # every word is quoted, so the user can't write FTS5 syntax, and is searched as a prefix
+    return " ".join(f'"{stem(word)}"*' for word in words) or None
@@ -0,0 +1,75 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from collections import namedtuple
+from datetime import datetime, timezone
+import hashlib
+import threading
+import time
+
+
+MTIME_CHECK_INTERVAL = 1.0 # seconds between two checks of the snapshot file (and the store) for changes
+
+CachedPage = namedtuple("CachedPage", ["body", "etag", "last_modified", "mtime", "version"])
+#######################################################################################################
+# ===== [CLASS: In-memory cache of rendered snapshots] =====
+class SnapshotCache:
+    def __init__(self, get_mtime, render, get_version=None, check_interval=MTIME_CHECK_INTERVAL):
+        self.get_mtime = get_mtime # get_mtime(label) -> mtime of the snapshot file or None
+        self.render = render # render(label, variant) -> html string
+        # get_version(label) -> time of the last change of the source in the store or None,
+        # details and backfilled articles change the page without a new snapshot (and in any worker)
+        self.get_version = get_version
+        self.check_interval = check_interval
+
+        self._pages = {} # (label, variant) -> CachedPage
+        self._checked = {} # label -> (time.monotonic() of the last check, mtime, version)
+        self._lock = threading.Lock()
+
+    # ===== [METHOD: Get mtime of the snapshot and version of the store, but check them not too often] =====
+    def _current_state(self, label):
+        now = time.monotonic()
+        checked = self._checked.get(label)
+
+        if checked is not None and now - checked[0] < self.check_interval:
+            return checked[1], checked[2]
+
+        mtime = self.get_mtime(label)
+        version = self.get_version(label) if self.get_version else None
+        self._checked[label] = (now, mtime, version)
+        return mtime, version
+
+    # ===== [METHOD: Get rendered page of the source] =====
+    def get(self, label, variant=None):
+        key = (label, variant)
+        mtime, version = self._current_state(label)
+        page = self._pages.get(key)
+
+        if page is not None and page.mtime == mtime and page.version == version:
+            return page # snapshot and store are the same, so is the page
+
+        body = self.render(label, variant).encode("utf-8")
+        changed = max(mtime or 0, version or 0) or time.time()
+        page = CachedPage(
+            body = body,
+            etag = hashlib.sha1(body).hexdigest()[:20],
+            last_modified = datetime.fromtimestamp(int(changed), timezone.utc),
+            mtime = mtime,
+            version = version
+        )
+
+        if mtime is not None: # a placeholder without snapshot is never cached
+            with self._lock:
+                self._pages[key] = page
+
+        return page
+
+    # ===== [METHOD: Forget rendered pages of the source (or all of them)] =====
+    def invalidate(self, label=None):
+        with self._lock:
+            for key in list(self._pages):
+                if label is None or key[0] == label:
+                    del self._pages[key]
+
+            if label is None:
+                self._checked.clear()
+            else:
+                self._checked.pop(label, None)
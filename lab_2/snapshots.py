@@ -0,0 +1,55 @@
+# ===== [IMPORT: Importing external libraries] =====
+import msgpack
+
+# ===== [IMPORT: Importing standard libraries] =====
+import json
+import os
+import tempfile
+
+
+FORMATS = ["pretty", "compact", "binary"]
+
+MSGPACK_MAGIC = b"SNAP-MSGPACK\n" # binary snapshots start with a header, json ones with "{"
+#######################################################################################################
+# ===== [FUNCTION: Serialize the snapshot] =====
+def dumps(obj, fmt="compact"):
+    if fmt == "pretty":
+        return json.dumps(obj, indent = 4, ensure_ascii = False).encode("utf-8")
+    if fmt == "compact":
+        return json.dumps(obj, ensure_ascii = False, separators = (",", ":")).encode("utf-8")
+    if fmt == "binary":
+        return MSGPACK_MAGIC + msgpack.packb(obj, use_bin_type=True) # the format doesn't depend on the Python version
+
+    raise ValueError(f"[!] Unknown snapshot format: {fmt}! Available formats: {', '.join(FORMATS)}")
+
+# ===== [FUNCTION: Deserialize the snapshot of any format] =====
+def loads(data):
+    if data.startswith(MSGPACK_MAGIC):
+        return msgpack.unpackb(data[len(MSGPACK_MAGIC):], raw=False)
+
+    return json.loads(data.decode("utf-8"))
+
+# ===== [FUNCTION: Write the snapshot atomically] =====
+def write_snapshot(path, obj, fmt="compact"):
+    data = dumps(obj, fmt)
+    directory = os.path.dirname(os.path.abspath(path))
+
+    # readers see either the old file or the new one, never a half-written file
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temp_path, 0o644) # mkstemp makes files readable only by the owner
+        os.replace(temp_path, path)
+    except:
+        os.unlink(temp_path)
+        raise
+
+    return len(data)
+
+# ===== [FUNCTION: Read the snapshot] =====
+def read_snapshot(path):
+    with open(path, "rb") as file:
+        return loads(file.read())
@@ -0,0 +1,471 @@
+# ===== [IMPORT: Importing standard libraries] =====
+from array import array
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# ===== [IMPORT: Importing local modules] =====
+from search import build_match
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    link TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    title TEXT NOT NULL,
+    descr TEXT,
+    tags TEXT NOT NULL,          -- json array
+    hash TEXT NOT NULL,          -- hash of title, descr and tags, to find changed articles
+    position INTEGER NOT NULL,   -- place in the listing when the article was first seen
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    live INTEGER NOT NULL DEFAULT 1 -- 0 for older articles backfilled by the crawler, they aren't pushed as new
+);
+CREATE INDEX IF NOT EXISTS articles_by_source ON articles (source, first_seen DESC, position, link);
+CREATE INDEX IF NOT EXISTS articles_by_time ON articles (first_seen DESC, position, link);
+
+CREATE TABLE IF NOT EXISTS details (
+    link TEXT PRIMARY KEY,       -- details are fetched once per article, even if it's changed later
+    descr TEXT,                  -- full description from the page of the article
+    published TEXT,              -- as it's written on the page
+    author TEXT,
+    error TEXT,                  -- why the page of the article can't be read
+    fetched_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS signatures (
+    link TEXT PRIMARY KEY,
+    cluster TEXT NOT NULL,       -- articles of all sources about the same story share it
+    signature BLOB NOT NULL      -- MinHash of title and descr
+);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    key INTEGER NOT NULL,        -- band number and hash of the band of the signature
+    link TEXT NOT NULL,
+    PRIMARY KEY (key, link)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS pages (
+    hash TEXT PRIMARY KEY,       -- sha256 of the downloaded body, name of the file in the archive
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    encoding TEXT,
+    first_fetched REAL NOT NULL,
+    last_fetched REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    changed_at REAL              -- when its articles were changed besides a refresh (details, old articles found late)
+);
+"""
+
+# Full-text index of title, descr and tags. It's contentless: the text is kept by `articles` only,
+# and "ё" is written as "е" to be found by both. Triggers keep it up to date on every write.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_search USING fts5 (
+    title, descr, tags, content='', tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS articles_search_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_search (rowid, title, descr, tags)
+    VALUES (new.rowid, replace(replace(new.title, 'ё', 'е'), 'Ё', 'Е'),
+        replace(replace(new.descr, 'ё', 'е'), 'Ё', 'Е'), replace(replace(new.tags, 'ё', 'е'), 'Ё', 'Е'));
+END;
+
+CREATE TRIGGER IF NOT EXISTS articles_search_update AFTER UPDATE OF title, descr, tags ON articles BEGIN
+    INSERT INTO articles_search (articles_search, rowid, title, descr, tags)
+    VALUES ('delete', old.rowid, replace(replace(old.title, 'ё', 'е'), 'Ё', 'Е'),
+        replace(replace(old.descr, 'ё', 'е'), 'Ё', 'Е'), replace(replace(old.tags, 'ё', 'е'), 'Ё', 'Е'));
+    INSERT INTO articles_search (rowid, title, descr, tags)
+    VALUES (new.rowid, replace(replace(new.title, 'ё', 'е'), 'Ё', 'Е'),
+        replace(replace(new.descr, 'ё', 'е'), 'Ё', 'Е'), replace(replace(new.tags, 'ё', 'е'), 'Ё', 'Е'));
+END;
+"""
+SEARCH_WEIGHTS = (10.0, 2.0, 1.0) # bm25 weights of title, descr and tags
+ARTICLE_COLUMNS = "articles.rowid AS rowid, articles.*, signatures.cluster AS cluster, " \
+    "details.descr AS full_descr, details.published AS published, details.author AS author"
+ARTICLE_TABLES = "articles LEFT JOIN signatures USING (link) " \
+    "LEFT JOIN details USING (link)" # details are empty until the article is enriched
+MAX_PARAMS = 500 # sqlite limits the number of query parameters
+#######################################################################################################
+# ===== [FUNCTION: Hash the content of the article] =====
+def article_hash(article):
+    content = json.dumps([article['title'], article['descr'], article['tags']], ensure_ascii=False)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+# ===== [FUNCTION: Turn a database row into the article dict] =====
+def row_to_article(row):
+    return {
+        'title': row['title'],
+        'descr': row['descr'],
+        'link': row['link'],
+        'tags': json.loads(row['tags']),
+        'cluster': row['cluster'],
+        'source': row['source'],
+        'first_seen': row['first_seen'],
+        'last_seen': row['last_seen'],
+        'full_descr': row['full_descr'],
+        'published': row['published'],
+        'author': row['author']
+    }
+
+# ===== [FUNCTION: Make an opaque cursor pointing after the row] =====
+def make_cursor(row):
+    position = json.dumps([row['first_seen'], row['position'], row['link']])
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+# ===== [FUNCTION: Read the cursor] =====
+def parse_cursor(cursor):
+    try:
+        first_seen, position, link = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(first_seen), int(position), str(link)
+    except Exception:
+        raise ValueError(f"[!] Invalid cursor: {cursor}")
+
+# ===== [CLASS: Incremental article store (SQLite)] =====
+class ArticleStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local() # sqlite connections can't be shared between threads
+        self._write_lock = threading.Lock()
+
+        # the file is opened (and created) by the first query, not when the module with the store is imported
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._searchable = None
+
+    # ===== [METHOD: Create tables of the store (once)] =====
+    def _prepare(self, connection):
+        with self._schema_lock: # other threads wait until the tables exist
+            if self._schema_ready:
+                return
+
+            connection.executescript(SCHEMA)
+
+            # sqlite can be built without FTS5, then everything but the search works
+            try:
+                indexed = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'articles_search'").fetchone()
+                connection.executescript(SEARCH_SCHEMA)
+                if not indexed: # the store from the previous version, or a new one
+                    self._reindex(connection)
+                self._searchable = True
+            except sqlite3.OperationalError:
+                self._searchable = False
+
+            self._schema_ready = True
+
+    # ===== [METHOD: Can the articles be searched] =====
+    @property
+    def searchable(self):
+        self.connection()
+        return self._searchable
+
+    # ===== [METHOD: Get connection of the current thread] =====
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL") # readers in other workers don't wait for the writer
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+
+        if not self._schema_ready:
+            self._prepare(connection)
+
+        return connection
+
+    # ===== [METHOD: Close connection of the current thread] =====
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    # ===== [METHOD: Run the query for every part of the links, `{}` of the query is replaced with their placeholders] =====
+    def _select_in(self, query, links):
+        connection = self.connection()
+
+        for i in range(0, len(links), MAX_PARAMS):
+            chunk = links[i:i + MAX_PARAMS]
+            yield from connection.execute(query.format(",".join("?" * len(chunk))), chunk)
+
+    # ===== [METHOD: Save the articles of one refresh] =====
+    def add(self, source, url, articles, seen_at=None, first_seen=None, live=True):
+        # first_seen is given to new articles only, the crawler dates the older pages before the stored ones
+        # live=False: the new articles are old ones found late, they are not pushed to /stream clients
+        seen_at = time.time() if seen_at is None else seen_at
+        first_seen = seen_at if first_seen is None else first_seen
+        connection = self.connection()
+        counts = {'new': 0, 'changed': 0, 'unchanged': 0}
+
+        with self._write_lock, connection:
+            links = [article['link'] for article in articles]
+            known = dict(self._select_in("SELECT link, hash FROM articles WHERE link IN ({})", links))
+
+            inserted, changed, touched = [], [], []
+            for position, article in enumerate(articles):
+                content_hash = article_hash(article)
+                row = (article['title'], article['descr'], json.dumps(article['tags'], ensure_ascii=False), content_hash)
+
+                if article['link'] not in known:
+                    inserted.append((article['link'], source) + row + (position, first_seen, seen_at, int(live)))
+                    known[article['link']] = content_hash # the same link twice in one listing
+                elif known[article['link']] != content_hash:
+                    changed.append(row + (seen_at, article['link'], seen_at))
+                else:
+                    touched.append((seen_at, article['link']))
+
+            connection.executemany(
+                "INSERT INTO articles (link, source, title, descr, tags, hash, position, first_seen, last_seen, live) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", inserted
+            )
+            # pages re-extracted from the archive are older than what is stored, they don't replace newer content
+            connection.executemany(
+                "UPDATE articles SET title = ?, descr = ?, tags = ?, hash = ?, last_seen = ? WHERE link = ? AND last_seen <= ?",
+                changed
+            )
+            connection.executemany("UPDATE articles SET last_seen = MAX(last_seen, ?) WHERE link = ?", touched)
+            connection.execute(
+                "INSERT OR REPLACE INTO sources (source, url, refreshed_at, changed_at) "
+                "VALUES (?, ?, MAX(?, COALESCE((SELECT refreshed_at FROM sources WHERE source = ?), 0)), "
+                "(SELECT changed_at FROM sources WHERE source = ?))",
+                (source, url, seen_at, source, source)
+            )
+            if inserted or changed: # articles from old pages don't move refreshed_at, but they change the version
+                connection.execute(
+                    "UPDATE sources SET changed_at = MAX(?, COALESCE(changed_at, 0)) WHERE source = ?", (time.time(), source)
+                )
+
+        counts['new'], counts['changed'], counts['unchanged'] = len(inserted), len(changed), len(touched)
+        return counts
+
+    # ===== [METHOD: Build the search index from scratch] =====
+    def reindex(self):
+        connection = self.connection()
+
+        with self._write_lock:
+            self._reindex(connection)
+
+    def _reindex(self, connection):
+        # called by _prepare() too, which can run inside a write that already holds the lock
+        with connection:
+            connection.execute("INSERT INTO articles_search (articles_search) VALUES ('delete-all')")
+            connection.execute(
+                "INSERT INTO articles_search (rowid, title, descr, tags) "
+                "SELECT rowid, replace(replace(title, 'ё', 'е'), 'Ё', 'Е'), replace(replace(descr, 'ё', 'е'), 'Ё', 'Е'), "
+                "replace(replace(tags, 'ё', 'е'), 'Ё', 'Е') FROM articles"
+            )
+            connection.execute(
+                "INSERT INTO articles_search (articles_search, rank) VALUES ('rank', ?)",
+                ("bm25(" + ", ".join(map(str, SEARCH_WEIGHTS)) + ")",)
+            )
+
+    # ===== [METHOD: Find articles by words, the best matches first] =====
+    def search(self, text, source=None, limit=20):
+        if not self.searchable:
+            raise RuntimeError("[!] Search is not available!\n*[TIP]: SQLite of this Python is built without FTS5")
+
+        match = build_match(text)
+        if match is None:
+            return []
+
+        # the best rowids are found by the index alone, only they are joined with the articles
+        hits = "SELECT articles_search.rowid AS rowid, articles_search.rank AS score FROM articles_search"
+        params = [match]
+        if source is None:
+            hits += " WHERE articles_search MATCH ?"
+        else:
+            hits += " JOIN articles ON articles.rowid = articles_search.rowid WHERE articles_search MATCH ? AND source = ?"
+            params.append(source)
+        hits += " ORDER BY articles_search.rank LIMIT ?"
+        params.append(limit)
+
+        query = (
+            f"SELECT {ARTICLE_COLUMNS}, hits.score AS score FROM {ARTICLE_TABLES} "
+            f"JOIN ({hits}) AS hits ON hits.rowid = articles.rowid ORDER BY hits.score"
+        )
+
+        articles = []
+        for row in self.connection().execute(query, params):
+            article = row_to_article(row)
+            article['score'] = round(-row['score'], 3) # bm25 is negative, the bigger score is the better
+            articles.append(article)
+
+        return articles
+
+    # ===== [METHOD: Get clusters of the links which have them] =====
+    def clusters(self, links):
+        return dict(self._select_in("SELECT link, cluster FROM signatures WHERE link IN ({})", links))
+
+    # ===== [METHOD: Get articles sharing at least one LSH key] =====
+    def similar(self, keys):
+        rows = self.connection().execute(
+            "SELECT DISTINCT signatures.link, cluster, signature FROM lsh_buckets JOIN signatures USING (link) "
+            f"WHERE key IN ({','.join('?' * len(keys))})", keys
+        )
+
+        return {link: (cluster, array("Q", signature)) for link, cluster, signature in rows}
+
+    # ===== [METHOD: Save signatures of the new articles] =====
+    def save_signatures(self, rows):
+        # rows are (link, cluster, signature, LSH keys)
+        if not rows:
+            return
+
+        with self._write_lock, self.connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO signatures (link, cluster, signature) VALUES (?, ?, ?)",
+                [(link, cluster, sig.tobytes()) for link, cluster, sig, keys in rows]
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets (key, link) VALUES (?, ?)",
+                [(key, link) for link, cluster, sig, keys in rows for key in keys]
+            )
+
+    # ===== [METHOD: Remember the page saved to the archive] =====
+    def add_page(self, page_hash, source, url, encoding=None, fetched_at=None):
+        fetched_at = time.time() if fetched_at is None else fetched_at
+
+        with self._write_lock, self.connection() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO pages (hash, source, url, encoding, first_fetched, last_fetched) VALUES (?, ?, ?, ?, ?, ?)",
+                (page_hash, source, url, encoding, fetched_at, fetched_at)
+            )
+            connection.execute(
+                "UPDATE pages SET last_fetched = MAX(last_fetched, ?) WHERE hash = ?", (fetched_at, page_hash)
+            )
+
+    # ===== [METHOD: Get archived pages, the oldest first] =====
+    def pages(self, source=None):
+        query = "SELECT * FROM pages"
+        params = []
+
+        if source is not None:
+            query += " WHERE source = ?"
+            params.append(source)
+        query += " ORDER BY first_fetched, hash"
+
+        return [dict(row) for row in self.connection().execute(query, params)]
+
+    # ===== [METHOD: Get the links which are already stored] =====
+    def known(self, links):
+        return {link for link, in self._select_in("SELECT link FROM articles WHERE link IN ({})", links)}
+
+    # ===== [METHOD: Get the links which have no details yet] =====
+    def missing_details(self, links):
+        found = {link for link, in self._select_in("SELECT link FROM details WHERE link IN ({})", links)}
+
+        return [link for link in dict.fromkeys(links) if link not in found]
+
+    # ===== [METHOD: Save details of the article (or why they can't be read)] =====
+    def save_details(self, link, details=None, error=None, fetched_at=None):
+        details = details or {}
+        fetched_at = time.time() if fetched_at is None else fetched_at
+
+        with self._write_lock, self.connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO details (link, descr, published, author, error, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (link, details.get('descr'), details.get('published'), details.get('author'), error, fetched_at)
+            )
+            if error is None: # the articles of the source are changed, so is its version
+                connection.execute(
+                    "UPDATE sources SET changed_at = MAX(?, COALESCE(changed_at, 0)) "
+                    "WHERE source = (SELECT source FROM articles WHERE link = ?)", (fetched_at, link)
+                )
+
+    # ===== [METHOD: Get time when the oldest article of the source was first seen] =====
+    def oldest(self, source):
+        return self.connection().execute("SELECT MIN(first_seen) FROM articles WHERE source = ?", (source,)).fetchone()[0]
+
+    # ===== [METHOD: Get the latest articles, newest first] =====
+    def latest(self, source=None, limit=20, before=None, after=None):
+        query = f"SELECT {ARTICLE_COLUMNS} FROM {ARTICLE_TABLES}"
+        conditions, params = [], []
+
+        if source is not None:
+            conditions.append("source = ?")
+            params.append(source)
+        if before is not None: # first seen earlier than this time
+            conditions.append("first_seen < ?")
+            params.append(before)
+        if after is not None: # first seen later than this time
+            conditions.append("first_seen > ?")
+            params.append(after)
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY first_seen DESC, position, link LIMIT ?"
+        params.append(limit)
+
+        return [row_to_article(row) for row in self.connection().execute(query, params)]
+
+    # ===== [METHOD: Iterate over one page of articles, newest first] =====
+    def iter_page(self, source=None, limit=50, cursor=None):
+        # yields (article, cursor of this article), rows are read lazily, so a big page is never held in memory
+        query = f"SELECT {ARTICLE_COLUMNS} FROM {ARTICLE_TABLES}"
+        conditions, params = [], []
+
+        if source is not None:
+            conditions.append("source = ?")
+            params.append(source)
+        if cursor is not None:
+            first_seen, position, link = parse_cursor(cursor)
+            conditions.append(
+                "(first_seen < ? OR (first_seen = ? AND (position > ? OR (position = ? AND link > ?))))"
+            )
+            params += [first_seen, first_seen, position, position, link]
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY first_seen DESC, position, link LIMIT ?"
+        params.append(limit)
+
+        for row in self.connection().execute(query, params):
+            yield row_to_article(row), make_cursor(row)
+
+    # ===== [METHOD: Get id of the last added article] =====
+    def last_rowid(self):
+        return self.connection().execute("SELECT COALESCE(MAX(rowid), 0) FROM articles").fetchone()[0]
+
+    # ===== [METHOD: Get articles added after the given id, oldest first] =====
+    def added_since(self, rowid, limit=500):
+        # backfilled articles are skipped, they are older than what clients already have
+        rows = self.connection().execute(
+            f"SELECT {ARTICLE_COLUMNS} FROM {ARTICLE_TABLES} WHERE articles.rowid > ? AND live ORDER BY articles.rowid LIMIT ?",
+            (rowid, limit)
+        )
+
+        return [(row['rowid'], row_to_article(row)) for row in rows]
+
+    # ===== [METHOD: Get time of the last change of the source (or of any source)] =====
+    def version(self, source=None):
+        # a refresh, details of an article and articles found late all change what the api gives
+        changed_at = "MAX(refreshed_at, COALESCE(changed_at, 0))"
+
+        if source is None:
+            row = self.connection().execute(f"SELECT MAX({changed_at}) FROM sources").fetchone()
+        else:
+            row = self.connection().execute(f"SELECT {changed_at} FROM sources WHERE source = ?", (source,)).fetchone()
+
+        return row[0] if row is not None else None
+
+    # ===== [METHOD: Get url and time of the last refresh of the source] =====
+    def source_info(self, source):
+        row = self.connection().execute("SELECT * FROM sources WHERE source = ?", (source,)).fetchone()
+
+        return dict(row) if row is not None else None
+
+    # ===== [METHOD: Count stored articles] =====
+    def count(self, source=None):
+        if source is None:
+            return self.connection().execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+        return self.connection().execute("SELECT COUNT(*) FROM articles WHERE source = ?", (source,)).fetchone()[0]
@@ -1,7 +1,40 @@
 import json
 import unittest
 
-from lab_2 import get_html_page, find_articles, generate_json, BeautifulSoup, requests
+from bs4 import BeautifulSoup
+import requests
+
+from lab_2 import get_html_page, find_articles, generate_json
+from scheduler import RefreshScheduler, refresh_source
+from snapshot_cache import SnapshotCache
+from engines import engines
+from partial import ContainerSlicer, read_container
+from extractors import site_specs, get_extractor, get_detail_extractor
+from enricher import Enricher
+from dedup import DuplicateIndex
+from archive import PageArchive
+import reextract
+from crawler import crawl
+from store import ArticleStore
+from snapshots import FORMATS, write_snapshot, read_snapshot
+from events import Broadcaster, StoreFeed
+from metrics import Registry, stage_timer
+from fetcher import CircuitBreaker, CircuitOpenError, UpstreamStatusError, FetchConnectionError
+import fetcher
+import metrics
+
+from datetime import datetime
+import fcntl
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+
+import lab_2
 
 
 class CrawlerTests(unittest.TestCase):
@@ -59,6 +92,592 @@ class CrawlerTests(unittest.TestCase):
                 find_articles([])
                 find_articles({})
     
+    # ===== [TEST: Test that every parsing engine gives the same articles] =====
+    def test_engines_parity(self):
+        pages = ['lifehacker', 'mailru', 'nnru']
+
+        for page in pages:
+            with open("samples/" + page + ".htm", "r", encoding="utf-8") as file:
+                html_file = file.read()
+
+            expected = find_articles(BeautifulSoup(html_file, "html.parser"), page)
+
+            for name, engine in engines.items():
+                with self.subTest(page=page, engine=name):
+                    self.assertEqual(find_articles(engine.parse(html_file), page), expected)
+
+    # ===== [TEST: Test parsing of the articles container only] =====
+    def test_partial_parsing(self):
+        for page, spec in site_specs.items():
+            container = spec['strain']
+
+            with open("samples/" + page + ".htm", "rb") as file:
+                raw_page = file.read()
+
+            expected = find_articles(BeautifulSoup(raw_page.decode("utf-8"), "html.parser"), page)
+
+            # the page comes in chunks, like it's being downloaded
+            slicer = ContainerSlicer(container)
+            for i in range(0, len(raw_page), 1000):
+                if slicer.feed(raw_page[i:i + 1000]):
+                    break
+
+            self.assertLess(len(slicer.consumed), len(raw_page)) # the rest of the page wasn't needed
+            self.assertEqual(find_articles(BeautifulSoup(slicer.fragment.decode("utf-8"), "html.parser"), page), expected)
+
+            # bs4 builds the tree for the container only
+            strained = engines['bs4'].parse(raw_page.decode("utf-8"), only=container)
+            self.assertEqual(find_articles(strained, page), expected)
+
+            # the archived page is whole, even if only the container is parsed
+            response = mock.Mock()
+            response.iter_content.side_effect = lambda size: (raw_page[i:i + size] for i in range(0, len(raw_page), size))
+            self.assertEqual(read_container(response, container, whole=True), (raw_page, slicer.fragment))
+            self.assertEqual(read_container(response, container)[1], slicer.fragment)
+
+    # ===== [TEST: Test crawling deeper than the first page] =====
+    def test_crawl(self):
+        with open("samples/lifehacker.htm", "r", encoding="utf-8") as file:
+            lifehacker = file.read()
+        with open("samples/mailru.htm", "r", encoding="utf-8") as file:
+            mailru = file.read()
+
+        for engine in engines.values():
+            page = engine.parse(lifehacker)
+            self.assertEqual(get_extractor('lifehacker', engine).next_page(page), "https://lifehacker.ru/topics/news/page/2/")
+
+            page = engine.parse(mailru)
+            extractor = get_extractor('mailru', engine)
+            self.assertIsNone(extractor.next_page(page))
+            self.assertTrue(all(extractor.published(post) for post in extractor.posts(page)))
+
+        # 10 pages of 3 articles, the articles moved down by one while we crawled
+        def listing(number):
+            links = [f"https://site/{i}" for i in range(number * 3 - 4, number * 3 - 1) if i >= 0]
+            published = [f"2019-10-{30 - number}T12:00:00+03:00"] * len(links)
+            next_url = f"https://site/page/{number + 1}" if number < 10 else None
+            return [{'link': link} for link in links], published, next_url
+
+        requested = []
+        def get_listing(url):
+            requested.append(url)
+            return listing(int(url.rsplit("/", 1)[1] or 1))
+
+        # the links are followed one by one, every article is taken once
+        result = crawl("https://site/page/", get_listing, pages=4, delay=0)
+        self.assertEqual((result['pages'], result['stopped'], result['first_page']), (4, "pages", 2))
+        self.assertEqual([article['link'] for article in result['articles']], [f"https://site/{i}" for i in range(11)])
+
+        result = crawl("https://site/page/", get_listing, pages=20, delay=0)
+        self.assertEqual((result['pages'], result['stopped']), (10, "last_page"))
+
+        # the pages crawled before stop it, the first page doesn't
+        known = {f"https://site/{i}" for i in range(0, 12)}
+        result = crawl("https://site/page/", get_listing, pages=20, delay=0, is_known=lambda links: known & set(links))
+        self.assertEqual((result['pages'], result['stopped']), (2, "known"))
+
+        result = crawl("https://site/page/", get_listing, pages=20, delay=0, until=datetime(2019, 10, 25))
+        self.assertEqual((result['pages'], result['stopped']), (6, "until"))
+        self.assertEqual(len(result['articles']), 14) # nothing from the last page, it's older
+
+        # pages by number are downloaded in batches, the rest of the batch is thrown away after the stop
+        requested.clear()
+        result = crawl(
+            "https://site/page/", get_listing, pages=20, delay=0,
+            is_known=lambda links: known & set(links), page_url="https://site/page/{page}"
+        )
+        self.assertEqual((result['pages'], result['stopped']), (2, "known"))
+        self.assertEqual(len(requested), 3)
+
+        # a failed page stops the crawl, but keeps what was found
+        def broken(url):
+            if url.endswith("/3"):
+                raise ConnectionError("no route to host")
+            return get_listing(url)
+
+        result = crawl("https://site/page/", broken, pages=20, delay=0)
+        self.assertEqual((result['pages'], result['stopped'], len(result['articles'])), (2, "error", 5))
+        self.assertIn("ConnectionError", result['error'])
+
+        # the older articles found by the crawler are stored, but not pushed to /stream as new
+        with tempfile.TemporaryDirectory() as directory:
+            store = ArticleStore(os.path.join(directory, "articles.db"))
+            store.add("site", "https://site/", [{'title': "New", 'descr': "", 'link': "https://site/0", 'tags': []}])
+            store.add("site", "https://site/", [{'title': "Old", 'descr': "", 'link': "https://site/9", 'tags': []}], live=False)
+
+            self.assertEqual(store.count("site"), 2)
+            self.assertEqual([article['link'] for _, article in store.added_since(0)], ["https://site/0"])
+
+        # the crawl runs in the background, a second request for the same source joins it
+        release = threading.Event()
+        calls = []
+
+        def slow_crawl(page_label, pages, until):
+            calls.append((page_label, pages))
+            release.wait(5)
+            return {'pages': pages, 'new': 0}
+
+        client = lab_2.app.test_client()
+        with mock.patch.object(lab_2, "crawl_source", slow_crawl), mock.patch.dict(lab_2.crawl_jobs, clear=True):
+            first = client.post("/crawl", data={'src': "nnru", 'pages': "3"})
+            second = client.post("/crawl", data={'src': "nnru", 'pages': "7"})
+
+            self.assertEqual((first.status_code, second.status_code), (202, 202))
+            self.assertEqual(second.get_json()['pages'], 3) # the running crawl was joined
+            self.assertEqual(client.get(first.headers['Location']).get_json()['state'], "running")
+
+            release.set()
+            lab_2.crawl_jobs['nnru']['future'].result(5)
+            status = client.get("/crawl/nnru").get_json()
+            self.assertEqual((status['state'], status['result']['pages']), ("done", 3))
+            self.assertEqual(calls, [("nnru", 3)])
+            self.assertEqual(client.get("/crawl/mailru").status_code, 404)
+
+    # ===== [TEST: Test incremental article store] =====
+    def test_article_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ArticleStore(os.path.join(directory, "articles.db"))
+            first = [
+                {'title': "A", 'descr': "a", 'link': "https://site/a", 'tags': ["x"]},
+                {'title': "B", 'descr': "b", 'link': "https://site/b", 'tags': []}
+            ]
+            second = [
+                {'title': "C", 'descr': "c", 'link': "https://site/c", 'tags': []}, # new article
+                {'title': "A!", 'descr': "a", 'link': "https://site/a", 'tags': ["x"]}, # changed title
+                {'title': "B", 'descr': "b", 'link': "https://site/b", 'tags': []} # the same
+            ]
+
+            self.assertEqual(store.add("site", "https://site/", first, seen_at=100), {'new': 2, 'changed': 0, 'unchanged': 0})
+            self.assertEqual(store.add("site", "https://site/", second, seen_at=200), {'new': 1, 'changed': 1, 'unchanged': 1})
+            self.assertEqual(store.count("site"), 3) # nothing was duplicated
+
+            latest = store.latest("site", limit=2)
+            self.assertEqual([article['link'] for article in latest], ["https://site/c", "https://site/a"]) # newest first
+            self.assertEqual(latest[1]['title'], "A!") # with the changed content
+            self.assertEqual(latest[1]['first_seen'], 100) # but still first seen in the first refresh
+            self.assertEqual(latest[1]['last_seen'], 200)
+
+            older = store.latest("site", limit=10, before=200) # next page of the history
+            self.assertEqual([article['link'] for article in older], ["https://site/a", "https://site/b"])
+            self.assertEqual(store.source_info("site")['refreshed_at'], 200)
+
+    # ===== [TEST: Test enrichment of articles with details from their pages] =====
+    def test_enrichment(self):
+        article_page = """<html><head>
+            <meta property="og:description" content="Полное описание статьи.">
+            <meta property="article:published_time" content="2019-10-23T16:54:38+03:00">
+        </head><body><div itemprop="author"><span itemprop="name"> Иван Петров </span></div></body></html>"""
+
+        for engine in engines.values():
+            details = get_detail_extractor('nnru', engine).details( engine.parse(article_page) )
+            self.assertEqual(details, {
+                'descr': "Полное описание статьи.", 'published': "2019-10-23T16:54:38+03:00", 'author': "Иван Петров"
+            })
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = ArticleStore(os.path.join(directory, "articles.db"))
+            articles = [
+                {'title': t, 'descr': "Описание внутри статьи.", 'link': "https://site/" + t, 'tags': []}
+                for t in ["a", "b", "c", "d"]
+            ]
+            store.add("site", "https://site/", articles)
+
+            downloaded = []
+            release = threading.Event()
+            def get_details(link, page_label):
+                release.wait(5)
+                downloaded.append(link)
+                if link.endswith("c"):
+                    raise UpstreamStatusError("[!] not found", link, 404)
+                if link.endswith("d"):
+                    raise FetchConnectionError("[!] no route to host", link)
+                return {'descr': "Полный текст " + link, 'published': None, 'author': "Автор"}
+
+            enriched = []
+            enricher = Enricher(store, get_details, workers=2, on_enriched=enriched.append)
+            version = store.version("site")
+            links = [article['link'] for article in articles]
+
+            self.assertEqual(enricher.submit("site", links), 4)
+            self.assertEqual(enricher.submit("site", links), 0) # everything is already in the queue
+            release.set()
+            self.assertTrue(enricher.wait(5))
+
+            by_link = {article['link']: article for article in store.latest("site", 10)}
+            self.assertEqual(by_link["https://site/a"]['full_descr'], "Полный текст https://site/a")
+            self.assertEqual(by_link["https://site/a"]['author'], "Автор")
+            self.assertEqual(by_link["https://site/a"]['descr'], "Описание внутри статьи.") # the listing is untouched
+            self.assertIsNone(by_link["https://site/c"]['full_descr'])
+            self.assertEqual(enriched, ["site", "site"])
+            self.assertGreater(store.version("site"), version) # etags of the api are changed by the details
+            self.assertEqual(store.version(), store.version("site"))
+
+            # only the unavailable one is downloaded again, the missing page and the done ones are not
+            self.assertEqual(enricher.submit("site", links), 1)
+            self.assertTrue(enricher.wait(5))
+            self.assertEqual(sorted(downloaded), sorted(links + ["https://site/d"]))
+
+    # ===== [TEST: Test full-text search] =====
+    def test_search(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ArticleStore(os.path.join(directory, "articles.db"))
+            store.add("mailru", "https://mailru/", [
+                {'title': "Банки снизили ставки", 'descr': "Кредиты стали дешевле", 'link': "https://mailru/1", 'tags': ["ЭКОНОМИКА"]},
+                {'title': "Новая ёлка на площади", 'descr': "Праздник в Нижнем Новгороде", 'link': "https://mailru/2", 'tags': []}
+            ])
+            store.add("nnru", "https://nnru/", [
+                {'title': "Курс рубля", 'descr': "Аналитики банков ждут укрепления", 'link': "https://nnru/1", 'tags': []}
+            ])
+
+            def found(text, source=None):
+                return [article['link'] for article in store.search(text, source)]
+
+            self.assertEqual(found("банкам"), ["https://mailru/1", "https://nnru/1"]) # any form, the title goes first
+            self.assertEqual(found("БАНКИ", "nnru"), ["https://nnru/1"])
+            self.assertEqual(found("елка"), ["https://mailru/2"]) # "ё" is the same as "е"
+            self.assertEqual(found("нижний новгород"), ["https://mailru/2"])
+            self.assertEqual(found("экономика"), ["https://mailru/1"]) # tags are searched too
+            self.assertEqual(found('" OR *'), []) # FTS5 syntax is not passed through
+
+            # the index follows changes of the articles
+            store.add("nnru", "https://nnru/", [
+                {'title': "Курс евро", 'descr': "Без изменений", 'link': "https://nnru/1", 'tags': []}
+            ])
+            self.assertEqual(found("банки"), ["https://mailru/1"])
+            self.assertEqual(found("евро"), ["https://nnru/1"])
+
+            with mock.patch.object(lab_2, "store", store):
+                client = lab_2.app.test_client()
+                answer = client.get("/search?q=ставки").get_json()
+                self.assertEqual((answer['count'], answer['articles'][0]['source']), (1, "mailru"))
+                self.assertEqual(client.get("/search?q=").status_code, 400)
+                self.assertEqual(client.get("/search?q=a&source=unknown").status_code, 404)
+
+    # ===== [TEST: Test near-duplicate clusters across sources] =====
+    def test_duplicates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ArticleStore(os.path.join(directory, "articles.db"))
+            duplicates = DuplicateIndex(store)
+
+            mailru = [
+                {'title': "Центробанк снизил ключевую ставку до 6,5% годовых", 'descr': "Это уже четвертое снижение за год",
+                 'link': "https://mailru/1", 'tags': []},
+                {'title': "Apple представила новый iPhone", 'descr': "У смартфона три камеры", 'link': "https://mailru/2", 'tags': []}
+            ]
+            nnru = [
+                {'title': "ЦБ снизил ключевую ставку до 6,5% годовых", 'descr': "Четвертое снижение ставки за год",
+                 'link': "https://nnru/1", 'tags': []},
+                {'title': "В Нижнем Новгороде открыли новый мост", 'descr': "Описание внутри статьи.", 'link': "https://nnru/2", 'tags': []}
+            ]
+
+            duplicates.assign(mailru)
+            store.add("mailru", "https://mailru/", mailru)
+            duplicates.assign(nnru)
+            store.add("nnru", "https://nnru/", nnru)
+
+            self.assertEqual(nnru[0]['cluster'], mailru[0]['cluster']) # the same story on both sites
+            self.assertEqual(len({mailru[1]['cluster'], nnru[1]['cluster'], mailru[0]['cluster']}), 3)
+
+            # clusters are kept by link, and are given by the store too
+            again = [dict(nnru[0], cluster=None)]
+            with mock.patch("dedup.signature") as computed:
+                duplicates.assign(again)
+            self.assertFalse(computed.called)
+            self.assertEqual(again[0]['cluster'], mailru[0]['cluster'])
+            self.assertEqual(
+                {article['link']: article['cluster'] for article in store.latest(limit=10)},
+                {article['link']: article['cluster'] for article in mailru + nnru}
+            )
+
+    # ===== [TEST: Test archive of raw pages and extracting articles from it again] =====
+    def test_page_archive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ArticleStore(os.path.join(directory, "articles.db"))
+            archive = PageArchive(store, os.path.join(directory, "archive"))
+            expected = {}
+
+            for page in ['lifehacker', 'mailru', 'nnru']:
+                with open("samples/" + page + ".htm", "rb") as file:
+                    body = file.read()
+
+                first = archive.put(page, "https://" + page + "/", body, "utf-8", fetched_at=100)
+                second = archive.put(page, "https://" + page + "/", body, "utf-8", fetched_at=200)
+                self.assertEqual(first, second) # the same page is stored once
+                self.assertEqual(archive.get(first), body)
+                self.assertLess(os.path.getsize(archive.find(first)[0]), len(body) / 3) # compressed
+
+                expected[page] = find_articles(BeautifulSoup(body.decode("utf-8"), "html.parser"), page)
+
+            pages = store.pages()
+            self.assertEqual(len(pages), 3)
+            self.assertEqual({(page['first_fetched'], page['last_fetched']) for page in pages}, {(100, 200)})
+
+            # a page which can't be read is reported, the rest are extracted on all processes
+            store.add_page("0" * 64, "nnru", "https://nnru/", "utf-8", fetched_at=150)
+            store.add("nnru", "https://nnru/", [], seen_at=300)
+            with mock.patch("sys.stderr"):
+                result = reextract.reextract(store, DuplicateIndex(store), archive.directory, processes=2)
+
+            self.assertEqual((result['pages'], result['errors']), (4, 1))
+            self.assertEqual(result['articles'], sum(len(articles) for articles in expected.values()))
+            self.assertGreater(result['pages_per_second'], 0)
+            for page, articles in expected.items():
+                self.assertEqual(
+                    {article['link'] for article in store.latest(page, 100)}, {article['link'] for article in articles}
+                )
+                self.assertEqual(store.source_info(page)['refreshed_at'], 300 if page == 'nnru' else 200) # old pages don't move it
+                self.assertGreater(store.version(page), 300) # but api and pages see the new articles
+            self.assertEqual(store.added_since(0), []) # found in old pages, they are not new for /stream clients
+
+    # ===== [TEST: Test lazy import of the pipeline and preloading before fork] =====
+    def test_startup(self):
+        heavy = ["requests", "bs4", "lxml", "engines", "fetcher", "extractors"]
+        check = (
+            "import json, os, sys, lab_2; loaded = lambda: [m for m in %r if m in sys.modules]; "
+            "files = os.listdir('.'); client = lab_2.app.test_client(); "
+            "client.get('/nnru'); client.post('/update', data={'src': 'nnru'}); asked = os.path.exists('refresh.lock.nnru'); "
+            "before = loaded(); valid = lab_2.check_url('https://nn.ru/'); "
+            "print(json.dumps([before, loaded(), files, asked, valid]))" % heavy
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            # another worker refreshes: this one serves pages and passes the clicks to it, never loading the pipeline
+            with open(os.path.join(directory, "refresh.lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                output = subprocess.check_output(
+                    [sys.executable, "-c", check], cwd=directory, env=dict(os.environ, PYTHONPATH=os.path.abspath("."))
+                )
+        before, after, files, asked, valid = json.loads(output)
+        self.assertEqual(files, ["refresh.lock"]) # the store is opened by the first query, not by the import
+        self.assertTrue(asked) # the click was left for the refreshing worker
+        self.assertEqual(before, []) # serving cached pages doesn't need them
+        self.assertTrue(valid) # the functions of the pipeline import what they need
+        self.assertIn("requests", after)
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = ArticleStore(os.path.join(directory, "articles.db"))
+            with mock.patch.object(lab_2, "store", store), mock.patch("gc.freeze") as freeze:
+                lab_2.snapshot_cache.invalidate()
+                lab_2.preload()
+
+                self.assertTrue(freeze.called)
+                for page in lab_2.sites: # every snapshot is rendered in the master process
+                    self.assertIn((page, False), lab_2.snapshot_cache._pages)
+                lab_2.snapshot_cache.invalidate()
+
+    # ===== [TEST: Test snapshot writer and reader] =====
+    def test_snapshot_formats(self):
+        with open("samples/nnru.json", "r", encoding="utf-8") as file:
+            json_info = json.load(file)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "nnru_articles.json")
+
+            for fmt in FORMATS:
+                write_snapshot(path, json_info, fmt)
+                self.assertEqual(read_snapshot(path), json_info) # the reader detects the format by itself
+
+            self.assertEqual(os.listdir(directory), ["nnru_articles.json"]) # no temporary files are left
+            self.assertRaises(ValueError, write_snapshot, path, json_info, "xml")
+            self.assertEqual(read_snapshot(path), json_info) # a failed write doesn't touch the old snapshot
+
+    # ===== [TEST: Test paginated json api] =====
+    def test_api_pagination(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ArticleStore(os.path.join(directory, "articles.db"))
+            for i, page in enumerate(['lifehacker', 'mailru', 'nnru']):
+                with open("samples/" + page + ".json", "r", encoding="utf-8") as file:
+                    store.add(page, "https://" + page, json.load(file)['articles'], seen_at=100 + i)
+
+            with mock.patch.object(lab_2, "store", store):
+                client = lab_2.app.test_client()
+
+                # walk over all pages of one source
+                links, cursor = [], None
+                while True:
+                    response = client.get("/api/mailru/articles", query_string={'limit': 7, 'cursor': cursor or ""})
+                    self.assertEqual(response.status_code, 200)
+                    answer = json.loads(response.get_data(as_text=True))
+                    links += [article['link'] for article in answer['articles']]
+                    cursor = answer['next_cursor']
+                    if cursor is None:
+                        break
+
+                self.assertEqual(len(links), store.count("mailru")) # every article exactly once
+                self.assertEqual(len(set(links)), len(links))
+
+                # merged api: the newest source goes first
+                response = client.get("/api/articles?limit=3")
+                answer = json.loads(response.get_data(as_text=True))
+                self.assertEqual({article['source'] for article in answer['articles']}, {'nnru'})
+
+                # unchanged answer is not sent again
+                again = client.get("/api/articles?limit=3", headers={'If-None-Match': response.headers['ETag']})
+                self.assertEqual(again.status_code, 304)
+
+                self.assertEqual(client.get("/api/unknown/articles").status_code, 404)
+                self.assertEqual(client.get("/api/articles?cursor=broken").status_code, 400)
+
+    # ===== [TEST: Test push of new articles] =====
+    def test_new_articles_push(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ArticleStore(os.path.join(directory, "articles.db"))
+            store.add("site", "https://site/", [{'title': "Old", 'descr': "", 'link': "https://site/old", 'tags': []}])
+
+            broadcaster = Broadcaster()
+            feed = StoreFeed(store, broadcaster, interval=60)
+            feed.start()
+            try:
+                start_id = broadcaster.last_id # articles from before the start are not pushed
+
+                self.assertEqual(broadcaster.wait(start_id, timeout=0), []) # nothing new yet
+
+                store.add("site", "https://site/", [
+                    {'title': "New", 'descr': "", 'link': "https://site/new", 'tags': []},
+                    {'title': "Old", 'descr': "", 'link': "https://site/old", 'tags': []}
+                ])
+                feed.wake() # what parse() does after a refresh
+
+                events = broadcaster.wait(start_id, timeout=5)
+                self.assertEqual(len(events), 1) # only the difference is pushed
+                event_id, source, message = events[0]
+                self.assertEqual(source, "site")
+                self.assertIn('"title": "New"', message)
+                self.assertTrue(message.startswith(f"id: {event_id}\nevent: article\n"))
+                self.assertEqual(broadcaster.wait(event_id, timeout=0), []) # the client is up to date
+            finally:
+                feed.stop() # the database is removed with the directory
+
+        client = lab_2.app.test_client()
+        self.assertEqual(client.get("/stream?source=unknown").status_code, 404)
+
+        # streams can't take every thread of the worker
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        with mock.patch.object(lab_2, "stream_slots", slots):
+            response = client.get("/stream?source=nnru")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+
+    # ===== [TEST: Test metrics in Prometheus format] =====
+    def test_metrics(self):
+        registry = Registry()
+        latency = registry.histogram("test_seconds", "Test latency", ["source"], buckets=(0.1, 1))
+        latency.observe(0.05, source="a")
+        latency.observe(0.5, source="a")
+        latency.observe(5, source="a")
+
+        text = registry.render()
+        self.assertIn('# TYPE test_seconds histogram', text)
+        self.assertIn('test_seconds_bucket{source="a",le="0.1"} 1', text) # buckets are cumulative
+        self.assertIn('test_seconds_bucket{source="a",le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{source="a",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_count{source="a"} 3', text)
+
+        # errors of the pipeline stages are counted by exception type
+        with self.assertRaises(ValueError):
+            with stage_timer("parse", "metrics-test"):
+                raise ValueError("[!] broken page")
+        self.assertIn(
+            'crawler_errors_total{stage="parse",source="metrics-test",exception="ValueError"} 1',
+            metrics.registry.render()
+        )
+
+        client = lab_2.app.test_client()
+        client.get("/")
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_request_seconds_count{route="/",method="GET",status="200"}', response.get_data(as_text=True))
+
+    # ===== [TEST: Test retries and circuit breaker of the fetcher] =====
+    def test_fetch_retries_and_breaker(self):
+        hits = []
+
+        class FailingHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                hits.append(self.path)
+
+                if self.path.endswith(("/cut", "/slow")): # the body stops after 10 bytes of 1000
+                    self.send_response(200)
+                    self.send_header("Content-Length", "1000")
+                    self.end_headers()
+                    self.wfile.write(b"x" * 10)
+                    self.wfile.flush()
+                    if self.path.endswith("/slow"):
+                        time.sleep(0.5)
+                    self.close_connection = True
+                    return
+
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), FailingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/news"
+
+        try:
+            with mock.patch.object(fetcher, "BACKOFF_BASE", 0):
+                with self.assertRaises(UpstreamStatusError) as error:
+                    fetcher.fetch(url, retries=2)
+                self.assertEqual(error.exception.status_code, 503)
+                self.assertEqual(len(hits), 3) # the first attempt and two retries
+
+                # one failed fetch is one failure, whatever the number of its retries
+                self.assertRaises(UpstreamStatusError, fetcher.fetch, url, retries=0)
+                self.assertRaises(UpstreamStatusError, fetcher.fetch, url, retries=0)
+                self.assertEqual(len(hits), 5)
+
+                # three failed fetches in a row: the host is not requested anymore
+                self.assertRaises(CircuitOpenError, fetcher.fetch, url)
+                self.assertEqual(len(hits), 5)
+
+                # pages of articles have their own breaker, the listing's one doesn't stop them
+                self.assertRaises(UpstreamStatusError, fetcher.fetch, url, retries=0, channel=fetcher.DETAILS)
+                self.assertEqual(len(hits), 6)
+
+                # a body which breaks in the middle is retried and told to the breaker like a failed request
+                fetcher._breakers.clear()
+                hits.clear()
+                read = lambda response: response.content
+                self.assertRaises(FetchConnectionError, fetcher.fetch, url + "/cut", read=read, retries=1)
+                self.assertEqual(len(hits), 2)
+                self.assertEqual(fetcher.get_breaker(url).failures, 1)
+
+                self.assertRaises(fetcher.FetchTimeout, fetcher.fetch, url + "/slow", read=read, retries=0, timeout=(1, 0.2))
+                self.assertEqual(fetcher.get_breaker(url).failures, 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+            fetcher._breakers.clear()
+
+    # ===== [TEST: Test circuit breaker states] =====
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=0.2)
+
+        self.assertEqual(breaker.acquire(), 0)
+        breaker.failure()
+        self.assertEqual(breaker.state, "closed") # one failure is not enough
+        breaker.failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertGreater(breaker.acquire(), 0) # requests are not let through
+
+        time.sleep(0.25)
+        self.assertEqual(breaker.state, "half-open")
+        self.assertEqual(breaker.acquire(), 0) # one trial request
+        self.assertGreater(breaker.acquire(), 0) # but only one
+
+        breaker.failure() # the host is still dead
+        self.assertEqual(breaker.state, "open")
+
+        time.sleep(0.25)
+        self.assertEqual(breaker.acquire(), 0)
+        breaker.success() # the host is back
+        self.assertEqual(breaker.state, "closed")
+
     # ===== [TEST: Test get_html_page] =====
     def test_get_html(self):
         self.assertRaises(TypeError, get_html_page, None) # not an expected type
@@ -69,6 +688,189 @@ class CrawlerTests(unittest.TestCase):
         self.assertIs(type( get_html_page("https://lifehacker.ru/topics/news") ), type(BeautifulSoup("",  "html.parser")) )
         self.assertIs(type( get_html_page("https://news.mail.ru/economics/") ), type(BeautifulSoup("",  "html.parser")) )
         self.assertIs(type( get_html_page("https://www.nn.ru/news/") ), type(BeautifulSoup("",  "html.parser")) )
+
+    # ===== [TEST: Test refreshing of one source] =====
+    def test_refresh_source(self):
+        def fake_parse(url, page_label):
+            if page_label == 'broken':
+                raise ValueError("[!] Site is down")
+            return [{'title': url}]
+
+        good = refresh_source(fake_parse, 'good', "https://good.example/")
+        self.assertTrue(good['ok']) # the good source was refreshed
+        self.assertEqual(good['articles'], 1) # and its articles were counted
+
+        broken = refresh_source(fake_parse, 'broken', "https://broken.example/")
+        self.assertFalse(broken['ok']) # the error doesn't escape
+        self.assertIn("ValueError", broken['error']) # its type is reported
+
+    # ===== [TEST: Test coalescing of refresh requests] =====
+    def test_scheduler_coalescing(self):
+        release = threading.Event()
+        calls = []
+
+        def slow_parse(url, page_label):
+            calls.append(page_label)
+            release.wait(5)
+            return []
+
+        scheduler = RefreshScheduler({'slow': ["Slow source", "https://slow.example/", 60]}, slow_parse)
+
+        first = scheduler.request('slow')
+        second = scheduler.request('slow') # a click while the first refresh is still running
+
+        self.assertIs(first, second) # both requests wait for the same job
+        self.assertTrue(scheduler.is_refreshing('slow'))
+
+        release.set()
+        self.assertTrue(first.result(5)['ok'])
+        self.assertEqual(calls, ['slow']) # the source was fetched only once
+        self.assertFalse(scheduler.is_refreshing('slow'))
+        self.assertRaises(KeyError, scheduler.request, 'unknown')
+
+        scheduler.stop()
+
+        # a refresh longer than its interval is not requested again and again by the scheduler loop
+        release.clear()
+        calls.clear()
+        scheduler = RefreshScheduler({'slow': ["Slow source", "https://slow.example/", 0.05]}, slow_parse)
+        scheduler.start()
+        started = time.process_time()
+        time.sleep(0.5)
+
+        self.assertEqual(calls, ['slow'])
+        self.assertLess(time.process_time() - started, 0.2) # the loop sleeps instead of spinning
+
+        release.set()
+        scheduler.stop()
+
+    # ===== [TEST: Test that only one of the processes refreshes] =====
+    def test_scheduler_lock(self):
+        refreshed = [] # time.time() of every refresh, the snapshot of all schedulers is the same
+        refreshed_lock = threading.Lock()
+
+        def slow_parse(url, page_label):
+            time.sleep(0.1)
+            with refreshed_lock:
+                refreshed.append(time.time())
+            return []
+
+        def snapshot_age(page_label):
+            with refreshed_lock:
+                return time.time() - refreshed[-1] if refreshed else None
+
+        with tempfile.TemporaryDirectory() as directory, mock.patch("scheduler.LEADER_RETRY", 0.05), mock.patch("scheduler.REQUEST_POLL", 0.05):
+            lock_path = os.path.join(directory, "refresh.lock")
+            # every scheduler opens the lock file itself, so they lock each other out like gunicorn workers do
+            sites = {'src': ["Source", "https://src.example/", 0.3]}
+            schedulers = [RefreshScheduler(sites, slow_parse, snapshot_age, lock_path=lock_path) for _ in range(3)]
+            for scheduler in schedulers:
+                scheduler.start()
+
+            time.sleep(1)
+            self.assertEqual(sum(scheduler.leader for scheduler in schedulers), 1) # only one of them refreshes
+            self.assertLessEqual(len(refreshed), 5) # one refresh per interval, not one per scheduler
+
+            # a click in another process is passed to the refreshing one
+            leader = next(scheduler for scheduler in schedulers if scheduler.leader)
+            waiting = next(scheduler for scheduler in schedulers if not scheduler.leader)
+            sites['src'][2] = 60 # no more planned refreshes after the current one
+            time.sleep(0.5)
+            count = len(refreshed)
+
+            self.assertIsNone(waiting.request('src'))
+            self.assertTrue(waiting.is_refreshing('src'))
+            time.sleep(0.3)
+            self.assertEqual(len(refreshed), count + 1)
+            self.assertFalse(waiting.is_refreshing('src'))
+
+            # another process takes over, when the refreshing one exits
+            leader.stop()
+            time.sleep(0.2)
+            self.assertEqual(sum(scheduler.leader for scheduler in schedulers), 1)
+
+            for scheduler in schedulers:
+                scheduler.stop()
+            time.sleep(0.2) # the last refresh removes its mark before the directory is deleted
+
+    # ===== [TEST: Test cache of rendered snapshots] =====
+    def test_snapshot_cache(self):
+        mtimes = {'src': 100.0}
+        versions = {'src': 100.0}
+        renders = []
+
+        def render(label, variant):
+            renders.append(label)
+            return f"<p>{label} {mtimes[label]} {versions[label]}</p>"
+
+        cache = SnapshotCache(lambda label: mtimes[label], render, lambda label: versions[label], check_interval=0)
+
+        first = cache.get('src')
+        self.assertIs(cache.get('src'), first) # the same snapshot is rendered only once
+        self.assertEqual(len(renders), 1)
+
+        mtimes['src'] = 200.0 # snapshot file was rewritten
+        second = cache.get('src')
+        self.assertNotEqual(second.etag, first.etag) # new content gets a new ETag
+        self.assertEqual(len(renders), 2)
+
+        cache.invalidate('src') # refresh event
+        cache.get('src')
+        self.assertEqual(len(renders), 3)
+
+        versions['src'] = 300.0 # details were saved to the store by another worker, the snapshot is the same
+        third = cache.get('src')
+        self.assertEqual(len(renders), 4)
+        self.assertEqual(third.last_modified.timestamp(), 300)
+
+    # ===== [TEST: Test conditional fetching of unchanged pages] =====
+    def test_conditional_parse(self):
+        with open("samples/mailru.htm", "r", encoding="utf-8") as file:
+            html_file = file.read()
+
+        def make_response(status_code, body=b"", headers=None):
+            response = requests.models.Response()
+            response.status_code = status_code
+            response._content = body
+            response._content_consumed = True
+            response.encoding = "utf-8"
+            response.headers.update(headers or {})
+            return response
+
+        url = "https://news.mail.ru/economics/"
+        sent_headers = []
+        not_modified = make_response(304)
+        not_modified.close = mock.Mock()
+        responses = [
+            make_response(200, html_file.encode("utf-8"), {'ETag': '"v1"'}),
+            not_modified,
+            make_response(200, html_file.encode("utf-8")) # validators are gone, but the body is the same
+        ]
+
+        def fake_fetch(url, headers=None, read=None, channel=None):
+            sent_headers.append(headers)
+            response = responses.pop(0)
+            if read is not None and response.status_code == 200:
+                response.body = read(response)
+            return response
+
+        lab_2.parsed_pages.pop(url, None)
+        with mock.patch.object(fetcher, "fetch", fake_fetch), \
+             mock.patch.object(lab_2, "generate_json"), \
+             mock.patch.object(lab_2, "store"), \
+             mock.patch.dict(lab_2.app.config, {'ENRICHMENT': False, 'ARCHIVE': False}), \
+             mock.patch.object(lab_2, "duplicates"), \
+             mock.patch.object(lab_2, "find_articles", wraps=lab_2.find_articles) as parsed:
+            first = lab_2.parse(url, "mailru")
+            second = lab_2.parse(url, "mailru")
+            third = lab_2.parse(url, "mailru")
+
+        self.assertEqual(sent_headers[1], {'If-None-Match': '"v1"'}) # validator of the first response was sent back
+        self.assertEqual(parsed.call_count, 1) # 304 and the same body were not parsed again
+        not_modified.close.assert_called_once() # its connection went back to the pool
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+        lab_2.parsed_pages.pop(url, None)
         
 # --------------- [ENTRY POINT] ---------------
 if __name__ == '__main__':